@@ -0,0 +1,37 @@
+from collections import OrderedDict
+import tracemalloc
+import pytest
+
+# Peak memory use in KiB per benchmark, reported at the end of the run.
+peak_memory = OrderedDict()
+
+
+@pytest.fixture
+def measure(benchmark, request):
+    """
+    Benchmark func(*args) for time, and record its peak memory use in the
+    extra info of the benchmark. Memory is traced in a separate run, so it
+    doesn't slow down the timed runs.
+    """
+    def _measure(func, *args):
+        tracemalloc.start()
+        try:
+            func(*args)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peak_memory[request.node.name] = round(peak / 1024, 1)
+        benchmark.extra_info['peak_memory_kb'] = peak_memory[
+            request.node.name]
+        return benchmark(func, *args)
+    return _measure
+
+
+def pytest_terminal_summary(terminalreporter):
+    if len(peak_memory) == 0:
+        return
+    terminalreporter.section('peak memory')
+    width = max(len(name) for name in peak_memory.keys())
+    for name, peak in sorted(peak_memory.items(), key=lambda item: item[1]):
+        terminalreporter.write_line('{}  {:>12,.1f} KiB'.format(
+            name.ljust(width), peak))
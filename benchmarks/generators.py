@@ -0,0 +1,185 @@
+"""
+Generators for synthetic forms and Flask AppBuilder apps to benchmark the
+converters with.
+"""
+import enum
+from collections import OrderedDict
+from wtforms.form import Form
+from wtforms import validators
+from wtforms.fields import (StringField, IntegerField, DecimalField,
+                            BooleanField, DateTimeField, TextAreaField,
+                            SelectField, FormField)
+
+
+def _make_field(i):
+    """Return the i-th field of a synthetic form, cycling through types."""
+    factories = [
+        lambda: StringField('String %d' % i,
+                            validators=[validators.Length(1, 100)]),
+        lambda: IntegerField('Integer %d' % i,
+                             validators=[validators.NumberRange(0, 100),
+                                         validators.InputRequired()]),
+        lambda: DecimalField('Decimal %d' % i),
+        lambda: BooleanField('Boolean %d' % i),
+        lambda: DateTimeField('DateTime %d' % i),
+        lambda: TextAreaField('Text %d' % i, description='Some text'),
+        lambda: SelectField('Select %d' % i, choices=['a', 'b', 'c']),
+    ]
+    return factories[i % len(factories)]()
+
+
+def make_flat_form(num_fields):
+    """A form with num_fields fields of all supported basic types."""
+    attrs = OrderedDict([('field_%d' % i, _make_field(i))
+                         for i in range(num_fields)])
+    return type('FlatForm%d' % num_fields, (Form,), attrs)
+
+
+def make_nested_form(depth, fields_per_level=5):
+    """
+    A form nesting depth levels of subforms. Every level uses the subform of
+    the level below it twice, like a form with a home and work address.
+    """
+    form = make_flat_form(fields_per_level)
+    for level in range(depth):
+        attrs = OrderedDict([('field_%d' % i, _make_field(i))
+                             for i in range(fields_per_level)])
+        attrs['first'] = FormField(form, 'First')
+        attrs['second'] = FormField(form, 'Second')
+        form = type('NestedForm%d' % level, (Form,), attrs)
+    return form
+
+
+def make_select_form(num_choices, num_fields=5):
+    """A form with num_fields SelectFields of num_choices choices each."""
+    choices = ['Choice %d' % i for i in range(num_choices)]
+    attrs = OrderedDict([('select_%d' % i,
+                          SelectField('Select %d' % i, choices=choices))
+                         for i in range(num_fields)])
+    return type('SelectForm%d' % num_choices, (Form,), attrs)
+
+
+class FABApp:
+    """
+    A Flask AppBuilder app on an in-memory SQLite database with num_views
+    generated ModelViews. Every view has a lookup table with num_choices
+    rows (a QuerySelectField), a one-to-many related view and, if
+    conditions is True, a oneOf condition between two one-to-one related
+    views.
+
+    If geo is True, the views are GeoModelViews with a POINT column.
+    Geometry columns need PostGIS, so a database_uri pointing to a PostGIS
+    database has to be passed as well.
+    """
+
+    def __init__(self, num_views, num_fields=5, num_choices=10,
+                 conditions=True, geo=False, database_uri='sqlite:///'):
+        from flask import Flask
+        from flask_appbuilder import AppBuilder
+        from flask_sqlalchemy import SQLAlchemy
+
+        self.app = Flask('wtforms_jsonschema2_benchmark')
+        self.app.config.update({'SQLALCHEMY_DATABASE_URI': database_uri,
+                                'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+                                'CSRF_ENABLED': False,
+                                'WTF_CSRF_ENABLED': False,
+                                'SECRET_KEY': 'benchmark'})
+        self.db = SQLAlchemy(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        self.appbuilder = AppBuilder(self.app, self.db.session)
+        self._lookups = []
+        self.views = [self._make_view(i, num_fields, conditions, geo)
+                      for i in range(num_views)]
+        self.db.create_all()
+        for lookup in self._lookups:
+            for j in range(num_choices):
+                self.db.session.add(lookup(name='Choice %d' % j))
+        self.db.session.commit()
+
+    def close(self):
+        self.db.session.remove()
+        self.db.drop_all()
+        self.ctx.pop()
+
+    def _make_view(self, i, num_fields, conditions, geo):
+        from sqlalchemy import (Column, Integer, String, Numeric, ForeignKey,
+                                Enum)
+        from sqlalchemy.orm import relationship
+        from flask_appbuilder import ModelView
+        from flask_appbuilder.models.sqla.interface import SQLAInterface
+        from wtforms_jsonschema2.conditions import oneOf
+
+        Model = self.db.Model
+        interface = SQLAInterface
+        base_view = ModelView
+        if geo:
+            from fab_addon_geoalchemy.models import Geometry, GeoSQLAInterface
+            from fab_addon_geoalchemy.views import GeoModelView
+            interface = GeoSQLAInterface
+            base_view = GeoModelView
+
+        def model(name, attrs):
+            attrs['__tablename__'] = name.lower()
+            attrs.setdefault('__repr__', lambda self: str(self.id))
+            return type(name, (Model,), attrs)
+
+        def view(name, datamodel, add_columns, **attrs):
+            attrs.update({'datamodel': interface(datamodel),
+                          'add_columns': add_columns,
+                          'edit_columns': add_columns,
+                          'show_title': name, 'list_title': name,
+                          'add_title': name, 'edit_title': name})
+            return type(name + 'View', (base_view,), attrs)
+
+        kinds = enum.Enum('Kind%d' % i, ['first', 'second'])
+        lookup = model('Lookup%d' % i, {
+            'id': Column(Integer, primary_key=True),
+            'name': Column(String(50), nullable=False),
+            '__repr__': lambda self: self.name})
+        self._lookups.append(lookup)
+        attrs = {'id': Column(Integer, primary_key=True),
+                 'kind': Column(Enum(kinds), nullable=False),
+                 'lookup_id': Column(Integer,
+                                     ForeignKey('lookup%d.id' % i)),
+                 'lookup': relationship(lookup)}
+        columns = ['kind', 'lookup']
+        for j in range(num_fields):
+            column = 'column_%d' % j
+            attrs[column] = Column(String(100)) if j % 2 else \
+                Column(Numeric, nullable=False)
+            columns.append(column)
+        if geo:
+            attrs['location'] = Column(Geometry(geometry_type='POINT',
+                                                srid=4326))
+            columns.append('location')
+        main = model('Main%d' % i, attrs)
+
+        def child(name, uselist):
+            child_model = model(name, {
+                'id': Column(Integer, primary_key=True),
+                'info': Column(String(100)),
+                'main_id': Column(Integer, ForeignKey('main%d.id' % i),
+                                  nullable=False),
+                'main': relationship(main, backref=name.lower())
+                if uselist else relationship(
+                    main, back_populates=name.lower())})
+            if not uselist:
+                setattr(main, name.lower(),
+                        relationship(child_model, back_populates='main',
+                                     uselist=False))
+            return view(name, child_model, ['info'])
+
+        related_views = [child('Detail%d' % i, True)]
+        attrs = {}
+        if conditions:
+            first = child('First%d' % i, False)
+            second = child('Second%d' % i, False)
+            related_views += [first, second]
+            attrs['_conditional_relations'] = [
+                oneOf(OrderedDict([(first, {'kind': 'first'}),
+                                   (second, {'kind': 'second'})]))]
+        main_view = view('Main%d' % i, main, columns,
+                         related_views=related_views, **attrs)
+        self.appbuilder.add_view_no_menu(main_view)
+        return main_view
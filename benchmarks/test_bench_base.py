@@ -0,0 +1,27 @@
+import pytest
+from wtforms_jsonschema2.base import BaseConverter
+from .generators import make_flat_form, make_nested_form, make_select_form
+
+
+@pytest.mark.parametrize('num_fields', [10, 100, 1000])
+def test_flat_form(measure, num_fields):
+    form = make_flat_form(num_fields)
+    measure(BaseConverter().convert, form)
+
+
+@pytest.mark.parametrize('depth', [1, 4, 8])
+def test_nested_form(measure, depth):
+    form = make_nested_form(depth)
+    measure(BaseConverter().convert, form)
+
+
+@pytest.mark.parametrize('depth', [1, 4, 8])
+def test_nested_form_refs(measure, depth):
+    form = make_nested_form(depth)
+    measure(BaseConverter(subform_refs=True).convert, form)
+
+
+@pytest.mark.parametrize('num_choices', [10, 1000, 10000])
+def test_select_form(measure, num_choices):
+    form = make_select_form(num_choices)
+    measure(BaseConverter().convert, form)
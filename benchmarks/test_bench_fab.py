@@ -0,0 +1,25 @@
+import pytest
+from .generators import FABApp
+
+pytest.importorskip('flask_appbuilder')
+
+from wtforms_jsonschema2.fab import FABConverter  # noqa: E402
+
+
+@pytest.fixture
+def fab_app(request):
+    fab_app = FABApp(**request.param)
+    yield fab_app
+    fab_app.close()
+
+
+@pytest.mark.parametrize('fab_app', [
+    {'num_views': 1},
+    {'num_views': 10},
+    {'num_views': 50},
+    {'num_views': 10, 'num_choices': 1000},
+    {'num_views': 10, 'conditions': False},
+], indirect=True, ids=['1-view', '10-views', '50-views',
+                       '10-views-1000-choices', '10-views-no-conditions'])
+def test_fab_convert(measure, fab_app):
+    measure(FABConverter().convert, fab_app.views)
@@ -0,0 +1,29 @@
+import os
+import pytest
+from .generators import FABApp
+
+pytest.importorskip('fab_addon_geoalchemy')
+
+from wtforms_jsonschema2.geofab import GeoFABConverter  # noqa: E402
+
+# Geometry columns need PostGIS, point this to a PostGIS database to run
+# these benchmarks, for instance postgresql:///test
+DATABASE_URI = os.environ.get('BENCHMARK_POSTGIS_URI')
+
+
+@pytest.fixture
+def geo_app(request):
+    if DATABASE_URI is None:
+        pytest.skip('BENCHMARK_POSTGIS_URI is not set')
+    geo_app = FABApp(geo=True, database_uri=DATABASE_URI, **request.param)
+    yield geo_app
+    geo_app.close()
+
+
+@pytest.mark.parametrize('geo_app', [
+    {'num_views': 1},
+    {'num_views': 10},
+    {'num_views': 50},
+], indirect=True, ids=['1-view', '10-views', '50-views'])
+def test_geofab_convert(measure, geo_app):
+    measure(GeoFABConverter().convert, geo_app.views)
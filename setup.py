@@ -17,7 +17,8 @@ with codecs.open('README.md') as f:
 extras = {
     'fab': ['Flask-AppBuilder>=1.13.0', 'pillow'],
     'geofab': ['fab-addon-geoalchemy', 'Flask-AppBuilder>=1.13.0', 'pillow'],
-    'test': ['pytest', 'pytest-cov']
+    'test': ['pytest', 'pytest-cov'],
+    'benchmark': ['pytest-benchmark', 'Flask-AppBuilder>=1.13.0', 'pillow']
 }
 
 
@@ -30,9 +31,11 @@ setup(
     url="https://github.com/dolfandringa/wtforms_jsonschema",
     author="Dolf Andringa",
     author_email="dolfandringa@gmail.com",
-    packages=find_packages(exclude=['contrib', 'docs', 'tests']),
+    packages=find_packages(exclude=['contrib', 'docs', 'tests',
+                                    'benchmarks']),
     include_package_data=True,
     package_data={'': ['LICENSE']},
+    python_requires='>=3.6',
     install_requires=['wtforms'],
     setup_requires=['pytest-runner'],
     tests_require=extras['test']+extras['fab']+extras['geofab'],
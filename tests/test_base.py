@@ -1,13 +1,19 @@
+import subprocess
+import sys
+import threading
 import copy
 from collections import OrderedDict
-from wtforms_jsonschema2.base import BaseConverter
+from contextlib import contextmanager
+from wtforms_jsonschema2.base import (BaseConverter, FieldSpec, converts,
+                                      dynamic)
 from wtforms_jsonschema2.exceptions import UnsupportedFieldException
+from wtforms_jsonschema2.refresh import RefreshableSchema
 from unittest import TestCase
 from wtforms.form import Form
 from wtforms import validators
 from wtforms.fields import (StringField, DecimalField, SelectField,
                             IntegerField, Field, DateTimeField,
-                            TextAreaField)
+                            TextAreaField, FormField, FieldList)
 from wtforms.widgets import TextInput
 
 
@@ -147,3 +153,308 @@ class TestFormConvert(TestCase):
     def test_simple_form(self):
         self.assertEqual(self.converter.convert(SimpleTestForm),
                          SimpleTestForm._schema)
+
+
+class AddressForm(Form):
+    instances = 0
+
+    street = StringField('Street')
+    city = StringField('City', validators=[validators.required()])
+
+    def __init__(self, *args, **kwargs):
+        AddressForm.instances += 1
+        super().__init__(*args, **kwargs)
+
+
+address_schema = OrderedDict([
+    ('type', 'object'),
+    ('properties', OrderedDict([
+        ('street', {
+            'type': 'string',
+            'title': 'Street',
+            'maxLength': 255
+        }),
+        ('city', {
+            'type': 'string',
+            'title': 'City',
+            'maxLength': 255
+        })
+    ])),
+    ('required', ['city'])
+])
+
+
+class ContactForm(Form):
+    home = FormField(AddressForm, 'Home Address')
+    work = FormField(AddressForm, 'Work Address')
+
+
+class CountryForm(Form):
+    country = SelectField('Country', choices=['NL', 'BE'])
+
+
+class CountriesForm(Form):
+    home = FormField(CountryForm, 'Home Country')
+    work = FormField(CountryForm, 'Work Country')
+
+
+class DynamicSelectConverter(BaseConverter):
+    @converts(SelectField)
+    @dynamic
+    def select_field(self, field):
+        return super().select_field(field)
+
+
+class TestSubformConvert(TestCase):
+    def setUp(self):
+        self.maxDiff = None
+        AddressForm.instances = 0
+
+    def test_subforms(self):
+        schema = BaseConverter().convert(ContactForm)
+        home = OrderedDict(address_schema)
+        home['title'] = 'Home Address'
+        work = OrderedDict(address_schema)
+        work['title'] = 'Work Address'
+        self.assertEqual(schema, OrderedDict([
+            ('type', 'object'),
+            ('properties', OrderedDict([('home', home), ('work', work)]))
+        ]))
+        self.assertEqual(AddressForm.instances, 2)
+        # The subforms don't share their properties
+        del schema['properties']['home']['properties']['city']
+        self.assertIn('city', schema['properties']['work']['properties'])
+
+    def test_subform_dynamic(self):
+        refreshable = RefreshableSchema(DynamicSelectConverter(),
+                                        CountriesForm)
+        properties = refreshable.schema['properties']
+        # The dynamic properties of every copy of the subform are recorded
+        self.assertEqual(len(refreshable.nodes), 2)
+        self.assertIs(refreshable.nodes[0].node,
+                      properties['home']['properties']['country'])
+        self.assertIs(refreshable.nodes[1].node,
+                      properties['work']['properties']['country'])
+
+    def test_select_not_dynamic(self):
+        # Converting the bound field again would never show new choices
+        refreshable = RefreshableSchema(BaseConverter(), CountriesForm)
+        self.assertEqual(refreshable.nodes, [])
+
+    def test_subform_refs(self):
+        schema = BaseConverter(subform_refs=True).convert(ContactForm)
+        self.assertEqual(schema, OrderedDict([
+            ('type', 'object'),
+            ('properties', OrderedDict([
+                ('home', OrderedDict([
+                    ('$ref', '#/definitions/AddressForm'),
+                    ('title', 'Home Address')
+                ])),
+                ('work', OrderedDict([
+                    ('$ref', '#/definitions/AddressForm'),
+                    ('title', 'Work Address')
+                ]))
+            ])),
+            ('definitions', OrderedDict([('AddressForm', address_schema)]))
+        ]))
+        self.assertEqual(AddressForm.instances, 2)
+
+
+class FieldListForm(Form):
+    phones = FieldList(StringField('Phone'), 'Phone Numbers', min_entries=1,
+                       max_entries=3)
+    addresses = FieldList(FormField(AddressForm, 'Address'))
+
+
+class TestFieldListConvert(TestCase):
+    def setUp(self):
+        self.maxDiff = None
+        AddressForm.instances = 0
+
+    def test_field_list(self):
+        form = FieldListForm(data={'addresses': [{}] * 5})
+        self.assertEqual(len(form.addresses.entries), 5)
+        AddressForm.instances = 0
+        schema = BaseConverter().convert(form)
+        address = OrderedDict(address_schema)
+        address['title'] = 'Address'
+        self.assertEqual(schema['properties'], OrderedDict([
+            ('phones', {
+                'type': 'array',
+                'title': 'Phone Numbers',
+                'items': {
+                    'type': 'string',
+                    'title': 'Phone',
+                    'maxLength': 255
+                },
+                'minItems': 1,
+                'maxItems': 3
+            }),
+            ('addresses', {
+                'type': 'array',
+                'title': 'Addresses',
+                'items': address
+            })
+        ]))
+        # The template is converted once, regardless of the number of entries
+        self.assertEqual(AddressForm.instances, 1)
+
+    def test_field_list_refs(self):
+        converter = BaseConverter(subform_refs=True)
+        schema = OrderedDict([('type', 'object'),
+                              ('properties', OrderedDict()),
+                              ('definitions', OrderedDict())])
+        field, req = converter.convert_field(FieldListForm().addresses,
+                                             schema['definitions'])
+        schema['properties']['addresses'] = field
+        self.assertEqual(field['items'], OrderedDict([
+            ('$ref', '#/definitions/AddressForm'),
+            ('title', 'Address')
+        ]))
+        self.assertNotIn('definitions', field)
+        # The definitions are added to the root of the schema
+        self.assertEqual(schema['definitions'],
+                         OrderedDict([('AddressForm', address_schema)]))
+        # Without a schema to add them to, the subforms are inlined
+        field, req = converter.convert_field(FieldListForm().addresses)
+        address = OrderedDict(address_schema)
+        address['title'] = 'Address'
+        self.assertEqual(field['items'], address)
+
+
+class TestCompactConvert(TestCase):
+    def test_compact(self):
+        converter = BaseConverter(compact=True, titles=False)
+        schema = converter.convert(ContactForm)
+        self.assertIs(type(schema), dict)
+        self.assertIs(type(schema['properties']), dict)
+        self.assertEqual(schema['properties']['home'], {
+            'type': 'object',
+            'properties': {
+                'street': {'type': 'string', 'maxLength': 255},
+                'city': {'type': 'string', 'maxLength': 255}
+            },
+            'required': ['city']
+        })
+        dumped = converter.dumps(schema)
+        self.assertNotIn(' ', dumped)
+        self.assertNotIn('title', dumped)
+
+    def test_dumps(self):
+        converter = BaseConverter()
+        dumped = converter.dumps(converter.convert(SimpleTestForm))
+        self.assertIn('"title": "First Name"', dumped)
+        self.assertIn('"maximum": 1000', dumped)
+
+
+class TupleConverter(BaseConverter):
+    @converts(CustomField)
+    def custom_field(self, field):
+        fieldtype, options, required = self.string_field(field)
+        options['format'] = 'custom'
+        return fieldtype, options, required
+
+
+class TestFieldSpec(TestCase):
+    def test_field_spec(self):
+        spec = BaseConverter().field_spec(SimpleTestForm().age)
+        self.assertIsInstance(spec, FieldSpec)
+        self.assertEqual(spec.fieldtype, 'integer')
+        self.assertEqual(spec.options, {'minimum': 0, 'maximum': 10})
+        self.assertTrue(spec.required)
+        self.assertFalse(hasattr(spec, '__dict__'))
+
+    def test_to_schema(self):
+        options = {'minimum': 0, 'maximum': 10}
+        schema = FieldSpec('integer', options).to_schema()
+        self.assertEqual(list(schema.items()), [
+            ('type', 'integer'), ('minimum', 0), ('maximum', 10)])
+        # The options of the converter are left alone
+        schema['title'] = 'Age'
+        self.assertEqual(options, {'minimum': 0, 'maximum': 10})
+
+    def test_tuple_converter(self):
+        schema = TupleConverter().convert(UnsupportedForm)
+        self.assertEqual(schema['properties']['custom_field'], {
+            'type': 'string',
+            'title': 'Custom Field',
+            'maxLength': 255,
+            'format': 'custom'
+        })
+
+
+class PathConverter(BaseConverter):
+    @converts(__name__ + '.CustomField')
+    def custom_field(self, field):
+        return FieldSpec('string', {'format': 'custom'})
+
+
+class TestLazyConverters(TestCase):
+    def test_converts_path(self):
+        schema = PathConverter().convert(UnsupportedForm)
+        self.assertEqual(schema['properties']['custom_field'], {
+            'type': 'string',
+            'title': 'Custom Field',
+            'format': 'custom'
+        })
+
+    def test_unloaded_path(self):
+        class MissingConverter(BaseConverter):
+            @converts('not_a_module.CustomField')
+            def custom_field(self, field):
+                pass
+        with self.assertRaises(UnsupportedFieldException):
+            MissingConverter().convert(UnsupportedForm)
+        self.assertNotIn('not_a_module', sys.modules)
+
+    def test_no_optional_imports(self):
+        code = ('import sys, wtforms_jsonschema2, wtforms_jsonschema2.fab\n'
+                'wtforms_jsonschema2.BaseConverter()\n'
+                'wtforms_jsonschema2.FABConverter()\n'
+                'print("flask_appbuilder" in sys.modules)')
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(output.strip(), b'False')
+
+
+@contextmanager
+def no_context():
+    yield
+
+
+def convert_concurrently(converter, form, threads=16, repeat=20,
+                         context=no_context):
+    """
+    Convert form (or views) in several threads at once, returning all
+    schemas. Every thread runs in the context manager context returns, like
+    an app context.
+    """
+    barrier = threading.Barrier(threads)
+    schemas = []
+
+    def run():
+        with context():
+            barrier.wait()
+            for i in range(repeat):
+                schemas.append(converter.dumps(converter.convert(form)))
+    workers = [threading.Thread(target=run) for i in range(threads)]
+    # Switch threads as often as possible to provoke races
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        sys.setswitchinterval(interval)
+    return schemas
+
+
+class TestThreadSafety(TestCase):
+    def test_shared_converter(self):
+        for converter in (BaseConverter(), BaseConverter(subform_refs=True)):
+            expected = converter.dumps(converter.convert(ContactForm))
+            schemas = convert_concurrently(converter, ContactForm)
+            self.assertEqual(len(schemas), 16 * 20)
+            self.assertEqual(set(schemas), set([expected]))
+            self.assertIsNone(converter._subforms)
@@ -0,0 +1,223 @@
+import gc
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from wtforms.form import Form
+from wtforms import validators
+from wtforms.fields import StringField, IntegerField, SelectField
+from wtforms_jsonschema2.base import (BaseConverter, _converter_tables,
+                                      converts, dynamic)
+from wtforms_jsonschema2.cache import SchemaCache, DiskCache, WeakLRUCache
+from wtforms_jsonschema2.fingerprint import fingerprint
+
+
+class PersonForm(Form):
+    name = StringField('Name', validators=[validators.Length(max=40)])
+    age = IntegerField('Age', validators=[validators.NumberRange(0, 120)])
+    kind = SelectField('Kind', choices=[('a', 'A'), ('b', 'B')],
+                       coerce=lambda x: x)
+
+
+class CountingConverter(BaseConverter):
+    conversions = 0
+
+    def convert(self, form):
+        self.conversions += 1
+        return super().convert(form)
+
+
+class SlowConverter(CountingConverter):
+    def convert(self, form):
+        time.sleep(0.05)
+        if getattr(form, 'broken', False):
+            raise ValueError('broken')
+        return super().convert(form)
+
+
+class DynamicConverter(CountingConverter):
+    @converts(SelectField)
+    @dynamic
+    def select_field(self, field):
+        return super().select_field(field)
+
+
+def make_form(max_length):
+    class PersonForm(Form):
+        name = StringField('Name',
+                           validators=[validators.Length(max=max_length)])
+    return PersonForm
+
+
+class TestFingerprint(TestCase):
+    def test_stable(self):
+        self.assertEqual(fingerprint(BaseConverter(), PersonForm),
+                         fingerprint(BaseConverter(), PersonForm()))
+        self.assertEqual(fingerprint(BaseConverter(), make_form(10)),
+                         fingerprint(BaseConverter(), make_form(10)))
+
+    def test_changes(self):
+        fp = fingerprint(BaseConverter(), make_form(10))
+        self.assertNotEqual(fp, fingerprint(BaseConverter(), make_form(20)))
+        self.assertNotEqual(fp, fingerprint(BaseConverter(titles=False),
+                                            make_form(10)))
+        self.assertNotEqual(fp, fingerprint(CountingConverter(),
+                                            make_form(10)))
+        converter = BaseConverter()
+        converter.cache_version = 2
+        self.assertNotEqual(fp, fingerprint(converter, make_form(10)))
+
+    def test_functions(self):
+        def make_choices_form(choices, coerce=str):
+            class ChoicesForm(Form):
+                kind = SelectField(choices=lambda: choices, coerce=coerce)
+            return ChoicesForm
+        fp = fingerprint(BaseConverter(), make_choices_form(['a']))
+        self.assertEqual(fp, fingerprint(BaseConverter(),
+                                         make_choices_form(['a'])))
+        # Closures and default arguments are part of the fingerprint
+        self.assertNotEqual(fp, fingerprint(BaseConverter(),
+                                            make_choices_form(['b'])))
+        self.assertNotEqual(fp, fingerprint(BaseConverter(),
+                                            make_choices_form(['a'], int)))
+
+
+class TestDiskCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_restart(self):
+        converter = CountingConverter()
+        schema = SchemaCache(converter, DiskCache(self.directory)).get(
+            PersonForm)
+        self.assertEqual(converter.conversions, 1)
+        # A new process with an empty memory cache
+        converter = CountingConverter()
+        cache = SchemaCache(converter, DiskCache(self.directory))
+        self.assertEqual(converter.dumps(cache.get(PersonForm)),
+                         converter.dumps(schema))
+        self.assertEqual(converter.conversions, 0)
+        self.assertEqual(os.listdir(self.directory),
+                         [fingerprint(converter, PersonForm) + '.json'])
+
+    def test_dynamic(self):
+        converter = DynamicConverter()
+        schema = SchemaCache(converter, DiskCache(self.directory)).get(
+            PersonForm)
+        self.assertIn('enum', schema['properties']['kind'])
+        # The choices could change before a restart
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertIsNone(converter._dynamic)
+        SchemaCache(converter, DiskCache(self.directory)).get(PersonForm)
+        self.assertEqual(converter.conversions, 2)
+
+    def test_missing(self):
+        disk = DiskCache(self.directory)
+        self.assertIsNone(disk.get('missing'))
+        with open(disk.path('broken'), 'w') as f:
+            f.write('{"type": ')
+        self.assertIsNone(disk.get('broken'))
+
+    def test_evict(self):
+        disk = DiskCache(self.directory, max_size=120)
+        disk.set('first', {'title': 'x' * 40})
+        disk.set('second', {'title': 'x' * 40})
+        os.utime(disk.path('first'), (0, 0))
+        os.utime(disk.path('second'), (1, 1))
+        # Reading marks first as recently used, so second is evicted
+        self.assertIsNotNone(disk.get('first'))
+        disk.set('third', {'title': 'x' * 40})
+        self.assertIsNone(disk.get('second'))
+        self.assertIsNotNone(disk.get('first'))
+        self.assertLessEqual(disk.size, 120)
+        disk.clear()
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class TestSchemaCache(TestCase):
+    def get_concurrently(self, cache, form, threads=8):
+        results = []
+
+        def run():
+            try:
+                results.append(cache.get(form))
+            except ValueError as e:
+                results.append(e)
+        workers = [threading.Thread(target=run) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return results
+
+    def test_single_flight(self):
+        converter = SlowConverter()
+        cache = SchemaCache(converter)
+        results = self.get_concurrently(cache, PersonForm)
+        self.assertEqual(converter.conversions, 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertIs(cache.get(PersonForm), results[0])
+
+    def test_error(self):
+        class BrokenForm(Form):
+            broken = True
+        cache = SchemaCache(SlowConverter())
+        results = self.get_concurrently(cache, BrokenForm)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertFalse(cache.cached(BrokenForm))
+
+    def test_invalidate(self):
+        cache = SchemaCache(CountingConverter())
+        schema = cache.get(PersonForm)
+        cache.invalidate(PersonForm)
+        self.assertIsNot(cache.get(PersonForm), schema)
+        self.assertEqual(cache.converter.conversions, 2)
+
+
+class TestWeakLRUCache(TestCase):
+    def test_lru(self):
+        cache = WeakLRUCache(maxsize=2)
+        cache['a'] = 1
+        cache['b'] = 2
+        self.assertEqual(cache.get('a'), 1)
+        cache['c'] = 3
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache['a'], 1)
+        self.assertEqual(cache.setdefault('c', 4), 3)
+        with self.assertRaises(KeyError):
+            cache['b']
+
+    def test_weak_keys(self):
+        cache = WeakLRUCache()
+        form = make_form(10)
+        cache[(form, 'add')] = 1
+        cache[((PersonForm, form), ())] = 2
+        cache[(PersonForm, 'add')] = 3
+        self.assertEqual(cache.get((form, 'add')), 1)
+        self.assertEqual(cache.get(((PersonForm, form), ())), 2)
+        del form
+        gc.collect()
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get((PersonForm, 'add')), 3)
+
+    def test_schema_cache(self):
+        class TenantConverter(BaseConverter):
+            pass
+        cache = SchemaCache(TenantConverter(), maxsize=50)
+        for i in range(100):
+            cache.get(make_form(i))
+            self.assertLessEqual(len(cache), 50)
+        gc.collect()
+        self.assertEqual(len(cache), 0)
+        self.assertIn(TenantConverter, _converter_tables)
+        del cache, TenantConverter
+        gc.collect()
+        self.assertFalse(any(cls.__name__ == 'TenantConverter'
+                             for cls in _converter_tables.keys()))
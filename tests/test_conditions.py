@@ -345,3 +345,23 @@ class TestFABConditionalViews(TestCase):
         pprint(observation_schema)
         self.assertEqual(schema, observation_schema)
         self.db.session.commit()
+
+    def test_lazy_conditional_view(self):
+        schema = self.converter.convert(ObservationView)
+        lazy = self.converter.convert_lazy(ObservationView)
+        self.assertEqual(list(lazy['definitions'].keys()),
+                         list(schema['definitions'].keys()))
+        self.assertEqual(lazy['definitions']['DeadObservation'],
+                         schema['definitions']['DeadObservation'])
+        self.assertEqual(lazy['definitions'].converted, ['DeadObservation'])
+        self.assertEqual(lazy, schema)
+
+    def test_pointer_to_condition(self):
+        schema = self.converter.convert(ObservationView)
+        lazy = self.converter.convert_lazy(ObservationView)
+        self.assertEqual(lazy.resolve('/definitions/DeadObservation/oneOf'),
+                         schema['definitions']['DeadObservation']['oneOf'])
+        self.assertEqual(
+            lazy.resolve('/definitions/DeadObservation/oneOf/1/required'),
+            schema['definitions']['DeadObservation']['oneOf'][1]['required'])
+        self.assertEqual(lazy['definitions'].converted, [])
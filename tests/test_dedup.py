@@ -0,0 +1,77 @@
+from pprint import pprint
+from collections import OrderedDict
+from wtforms_jsonschema2.base import BaseConverter
+from wtforms_jsonschema2.dedup import deduplicate, find_duplicates
+from unittest import TestCase
+from wtforms.form import Form
+from wtforms import validators
+from wtforms.fields import StringField, SelectField, FormField
+
+countries = ['Netherlands', 'Belgium', 'Germany', 'France', 'Luxembourg',
+             'Denmark']
+
+
+class AddressForm(Form):
+    street = StringField('Street', validators=[validators.required()])
+    city = StringField('City')
+    country = SelectField('Country', choices=countries)
+
+
+class ContactForm(Form):
+    name = StringField('Name')
+    nationality = SelectField('Nationality', choices=countries)
+    home = FormField(AddressForm, 'Home Address')
+    work = FormField(AddressForm, 'Work Address')
+
+
+class TwoAddressForm(Form):
+    home = FormField(AddressForm, 'Home Address')
+    work = FormField(AddressForm, 'Work Address')
+
+
+class TestDeduplicate(TestCase):
+    def setUp(self):
+        self.converter = BaseConverter()
+        self.maxDiff = None
+
+    def test_deduplicate(self):
+        schema = self.converter.convert(ContactForm)
+        deduplicated = deduplicate(schema)
+        pprint(deduplicated)
+        definitions = deduplicated['definitions']
+        self.assertEqual(list(definitions.keys()), ['Home', 'NationalityEnum'])
+        self.assertEqual(deduplicated['properties']['home'],
+                         {'$ref': '#/definitions/Home',
+                          'title': 'Home Address'})
+        self.assertEqual(deduplicated['properties']['work'],
+                         {'$ref': '#/definitions/Home',
+                          'title': 'Work Address'})
+        # Only annotations are left next to a $ref, which validators ignore
+        self.assertEqual(deduplicated['properties']['nationality'],
+                         {'$ref': '#/definitions/NationalityEnum',
+                          'title': 'Nationality'})
+        self.assertEqual(definitions['Home']['properties']['country'],
+                         {'$ref': '#/definitions/NationalityEnum',
+                          'title': 'Country'})
+        self.assertEqual(definitions['NationalityEnum'],
+                         {'type': 'string', 'enum': countries})
+        self.assertNotIn('title', definitions['Home'])
+        # The original schema is left untouched
+        self.assertEqual(schema, self.converter.convert(ContactForm))
+
+    def test_nested_duplicates(self):
+        # The country enum only occurs inside the address subform, so it
+        # should not be hoisted separately.
+        deduplicated = deduplicate(self.converter.convert(TwoAddressForm))
+        self.assertEqual(list(deduplicated['definitions'].keys()), ['Home'])
+        self.assertIn('enum', deduplicated['definitions']['Home']
+                      ['properties']['country'])
+
+    def test_nothing_to_deduplicate(self):
+        schema = self.converter.convert(AddressForm)
+        self.assertEqual(find_duplicates(schema), OrderedDict())
+        self.assertEqual(deduplicate(schema), schema)
+
+    def test_min_size(self):
+        schema = self.converter.convert(ContactForm)
+        self.assertEqual(deduplicate(schema, min_size=10000), schema)
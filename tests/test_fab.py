@@ -1,6 +1,21 @@
+import io
+import os
+import shutil
+import tempfile
+from contextlib import redirect_stdout
 from pprint import pprint
 from collections import OrderedDict
 from wtforms_jsonschema2.fab import FABConverter
+from wtforms_jsonschema2.tracing import TimingTracer
+from wtforms_jsonschema2.stats import ConversionStats
+from wtforms_jsonschema2.refresh import RefreshableSchema
+from wtforms_jsonschema2.warmup import SchemaWarmer
+from wtforms_jsonschema2 import profile
+from wtforms_jsonschema2.profile import profile_views
+from wtforms_jsonschema2.cache import SchemaCache, DiskCache
+from wtforms_jsonschema2.fingerprint import fingerprint
+from wtforms_jsonschema2.exceptions import QueryBudgetExceeded
+from tests.test_base import convert_concurrently
 from unittest import TestCase
 from wtforms.form import Form
 from flask_appbuilder.fields import (QuerySelectField, EnumField)
@@ -8,10 +23,11 @@ from flask_appbuilder import AppBuilder
 from flask import Flask
 from flask_appbuilder import ModelView
 from flask_appbuilder.models.sqla.interface import SQLAInterface
+from flask_appbuilder.models.sqla.filters import FilterEqual
 from sqlalchemy import (Column, Integer, String, ForeignKey, DateTime, Numeric,
                         Boolean, Text)
 from flask_appbuilder.models.mixins import ImageColumn
-from sqlalchemy import MetaData, create_engine
+from sqlalchemy import MetaData, create_engine, event, func, literal, cast
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import relationship
 
@@ -380,3 +396,376 @@ class TestFABFormConvert(TestCase):
         self.assertEqual(schema,
                          FABTestForm._schema)
         self.db.session.commit()
+
+    def test_compact(self):
+        converter = FABConverter(compact=True, titles=False)
+        schema = converter.convert(TextView)
+        self.assertIs(type(schema['definitions']['Text']), dict)
+        self.assertEqual(converter.dumps(schema),
+                         '{"type":"object","definitions":{"Text":{'
+                         '"type":"object","properties":{'
+                         '"textfield":{"type":"string"},'
+                         '"stringfield":{"type":"string","maxLength":255}}}},'
+                         '"properties":{'
+                         '"Text":{"$ref":"#/definitions/Text"}}}')
+
+    def test_timing_tracer(self):
+        tracer = TimingTracer()
+        self.converter.add_tracer(tracer)
+        self.converter.convert(PersonView)
+        self.assertEqual(list(tracer.views.keys()), ['Picture', 'Person'])
+        self.assertIn(('Person', 'person_type'), tracer.fields)
+        self.assertIn(('Picture', 'picture'), tracer.fields)
+        self.assertIn('choices', tracer.kinds)
+        self.assertIn('view_init', tracer.kinds)
+
+    def test_stats(self):
+        stats = ConversionStats(engine=db.engine)
+        self.converter.add_tracer(stats)
+        self.converter.convert(PersonView)
+        pprint(stats.as_dict())
+        self.assertEqual(stats.views, 2)
+        self.assertEqual(stats.view_inits, 2)
+        self.assertEqual(stats.fields['query_select_field'], 2)
+        self.assertEqual(stats.enums[('Person', 'person_type')], 2)
+        self.assertEqual(stats.queries, sum(stats.view_queries.values()))
+        self.assertGreater(stats.view_queries['Person'], 0)
+
+    def test_query_budget(self):
+        stats = ConversionStats(engine=db.engine, query_budget=0,
+                                on_budget='raise')
+        self.converter.add_tracer(stats)
+        with self.assertRaises(QueryBudgetExceeded):
+            self.converter.convert(PersonView)
+        stats.on_budget = 'warn'
+        with self.assertLogs('wtforms_jsonschema2.stats', 'WARNING'):
+            self.converter.convert(PersonView)
+
+    def test_refresh(self):
+        refreshable = RefreshableSchema(self.converter, PersonView)
+        schema = refreshable.get()
+        person_type = schema['definitions']['Person']['properties'][
+            'person_type']
+        self.assertEqual(len(person_type['enum']), 2)
+        # The person property of Picture is replaced by the relation
+        self.assertEqual([dyn.field.name for dyn in refreshable.nodes],
+                         ['person_type'])
+        self.db.session.add(PersonType(name='female'))
+        self.db.session.commit()
+        self.assertEqual(len(refreshable.get()['definitions']['Person'][
+            'properties']['person_type']['enum']), 2)
+        queries = []
+
+        def count(*args):
+            queries.append(args)
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            refreshable.refresh()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+        # Only the choices of person_type are loaded again (FAB counts the
+        # rows as well)
+        statements = [q[2] for q in queries]
+        pprint(statements)
+        self.assertTrue(all('FROM person_type' in s for s in statements))
+        self.assertLessEqual(len(statements), 2)
+        self.assertIs(schema['definitions']['Person']['properties'][
+            'person_type'], person_type)
+        self.assertEqual(person_type['enum'][2],
+                         {'id': '3', 'label': 'female'})
+
+    def test_refresh_on_commit(self):
+        refreshable = RefreshableSchema(self.converter, PersonView)
+        refreshable.watch(db.session)
+        try:
+            self.db.session.add(Observation(species='dolphin'))
+            self.db.session.commit()
+            self.assertFalse(refreshable.nodes[0].stale)
+            self.db.session.add(PersonType(name='female'))
+            self.db.session.commit()
+            self.assertTrue(refreshable.nodes[0].stale)
+            schema = refreshable.get()
+            self.assertFalse(refreshable.nodes[0].stale)
+        finally:
+            refreshable.unwatch()
+        self.assertEqual(len(schema['definitions']['Person']['properties'][
+            'person_type']['enum']), 3)
+
+    def test_refresh_ttl(self):
+        refreshable = RefreshableSchema(self.converter, PersonView, ttl=0)
+        self.db.session.add(PersonType(name='female'))
+        self.db.session.commit()
+        self.assertEqual(len(refreshable.get()['definitions']['Person'][
+            'properties']['person_type']['enum']), 3)
+
+    def test_warmup(self):
+        progress = []
+        warmer = SchemaWarmer(self.converter, appbuilder,
+                              progress=lambda *args: progress.append(args))
+        self.assertEqual(warmer.model_views(), [PersonView, PersonTypeView,
+                                                PictureView, ObservationView])
+        warmer.start()
+        self.assertTrue(warmer.wait(30))
+        self.assertEqual(warmer.errors, [])
+        self.assertEqual((warmer.done, warmer.total), (8, 8))
+        self.assertEqual(progress[-1], (8, 8, ObservationView, 'edit'))
+        self.assertTrue(warmer.cache.cached(PersonView, form_type='edit'))
+        self.assertIs(warmer.cache.get(PersonView, form_type='add'),
+                      warmer.cache.get(PersonView, form_type='add'))
+        self.assertIs(app.extensions['wtforms_jsonschema2'], warmer)
+
+    def test_warmup_views(self):
+        warmer = SchemaWarmer(self.converter, views=[ObservationView],
+                              form_types=('add',))
+        warmer.run()
+        self.assertTrue(warmer.wait(0))
+        self.assertEqual(warmer.errors, [])
+        self.assertTrue(warmer.cache.cached(ObservationView, form_type='add'))
+        # A warm-up that fails doesn't report itself as done
+        broken = SchemaWarmer(self.converter, views=42)
+        broken.run()
+        self.assertTrue(broken.ready.is_set())
+        self.assertFalse(broken.wait(0))
+        self.assertIsInstance(broken.failed, TypeError)
+        self.assertEqual(broken.errors, [(None, None, broken.failed)])
+
+    def test_disk_cache(self):
+        directory = tempfile.mkdtemp()
+        try:
+            schema = SchemaCache(FABConverter(), DiskCache(directory)).get(
+                ObservationView, form_type='add')
+            cache = SchemaCache(FABConverter(), DiskCache(directory))
+            self.assertTrue(os.path.exists(cache.backend.path(fingerprint(
+                cache.converter, ObservationView, form_type='add'))))
+            self.assertEqual(cache.get(ObservationView, form_type='add'),
+                             schema)
+            self.assertNotEqual(
+                fingerprint(cache.converter, PersonView, form_type='add'),
+                fingerprint(cache.converter, PersonView, form_type='edit'))
+            # The person types are loaded from the database
+            cache.get(PersonView, form_type='add')
+            self.assertFalse(os.path.exists(cache.backend.path(fingerprint(
+                cache.converter, PersonView, form_type='add'))))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_fingerprint_query_filters(self):
+        def make_view(value):
+            class FilteredPersonView(PersonView):
+                add_form_query_rel_fields = {
+                    'person_type': [['name', FilterEqual, value]]}
+            return FilteredPersonView
+        fingerprints = set(
+            fingerprint(self.converter, view, form_type='add')
+            for view in (make_view('male'), make_view('female'), PersonView))
+        self.assertEqual(len(fingerprints), 3)
+        self.assertEqual(
+            fingerprint(self.converter, make_view('male'), form_type='add'),
+            fingerprint(self.converter, make_view('male'), form_type='add'))
+
+    def test_shared_converter(self):
+        # Views without fields that query the in-memory database, which
+        # can't be shared between threads.
+        views = [TextView, ObservationView]
+        expected = self.converter.dumps(self.converter.convert(views))
+        schemas = convert_concurrently(self.converter, views, threads=8,
+                                       repeat=10, context=app.app_context)
+        self.assertEqual(len(schemas), 80)
+        self.assertEqual(set(schemas), set([expected]))
+
+    def test_lazy(self):
+        stats = ConversionStats()
+        self.converter.add_tracer(stats)
+        schema = self.converter.convert_lazy([PersonView, ObservationView])
+        self.assertEqual(list(schema['definitions'].keys()),
+                         ['Person', 'Picture', 'Observation'])
+        self.assertEqual(schema['definitions'].converted, [])
+        self.assertEqual(schema['definitions']['Picture'],
+                         person_observation_schema['definitions']['Picture'])
+        self.assertEqual(schema['definitions'].converted, ['Picture'])
+        self.assertEqual(stats.views, 1)
+        self.assertEqual(schema, person_observation_schema)
+        self.assertEqual(schema['definitions'].converted,
+                         ['Picture', 'Person', 'Observation'])
+        eager = FABConverter().convert([PersonView, ObservationView])
+        self.assertEqual(self.converter.dumps(schema),
+                         self.converter.dumps(eager))
+        self.assertEqual(schema.to_dict(), person_observation_schema)
+        with self.assertRaises(KeyError):
+            schema['definitions']['Missing']
+
+    def test_convert_fields(self):
+        stats = ConversionStats()
+        self.converter.add_tracer(stats)
+        schema = self.converter.convert_fields(PersonView,
+                                               ['name', 'pictures'])
+        person = person_observation_schema['definitions']['Person']
+        self.assertEqual(list(schema['properties'].keys()),
+                         ['name', 'pictures'])
+        self.assertEqual(schema['properties']['name'],
+                         person['properties']['name'])
+        self.assertEqual(schema['properties']['pictures'],
+                         person['properties']['pictures'])
+        self.assertEqual(schema['required'], ['name'])
+        self.assertNotIn('Picture', schema.get('definitions', {}))
+        self.assertEqual(sum(stats.fields.values()), 1)
+        form = self.converter.convert_fields(PersonView().add_form,
+                                             ['dt'])
+        self.assertEqual(list(form['properties'].keys()), ['dt'])
+
+    def test_convert_pointer(self):
+        stats = ConversionStats(engine=db.engine)
+        self.converter.add_tracer(stats)
+        views = [PersonView, ObservationView]
+        enum = self.converter.convert_pointer(
+            views, '/definitions/Person/properties/person_type/enum')
+        self.assertEqual(enum, person_observation_schema['definitions'][
+            'Person']['properties']['person_type']['enum'])
+        self.assertEqual(stats.fields, {'query_select_field': 1})
+        self.assertEqual(stats.views, 1)
+        # The relation to the parent view isn't part of the definition
+        with self.assertRaises(KeyError):
+            self.converter.convert_pointer(
+                views, '/definitions/Picture/properties/person')
+        with self.assertRaises(KeyError):
+            self.converter.convert_pointer(
+                views, '/definitions/Person/properties/missing')
+        stats.reset()
+        schema = self.converter.convert_lazy(views)
+        self.assertEqual(schema.resolve('/definitions/Person/title'),
+                         'Person')
+        self.assertEqual(schema['definitions'].converted, ['Person'])
+        self.assertEqual(schema.resolve('/properties/Observation/$ref'),
+                         '#/definitions/Observation')
+        self.assertEqual(schema.resolve('/definitions/Person/required/1'),
+                         'person_type')
+        self.assertEqual(schema.resolve(''), person_observation_schema)
+        with self.assertRaises(ValueError):
+            schema.resolve('definitions')
+
+    def test_sharded(self):
+        sharded = self.converter.convert_sharded([PersonView,
+                                                  ObservationView])
+        self.assertEqual(sharded.names, ['Person', 'Picture', 'Observation'])
+        person = sharded.shard('Person')
+        self.assertEqual(person['properties']['pictures']['items'],
+                         [{'$ref': 'Picture.json'}])
+        self.assertEqual(sharded.lazy['definitions'].converted, ['Person'])
+        # The lazily converted definition still refers to the definitions
+        self.assertEqual(sharded.lazy['definitions']['Person']['properties'][
+            'pictures']['items'], [{'$ref': '#/definitions/Picture'}])
+        index = sharded.index()
+        self.assertEqual(index['properties']['Person'],
+                         {'$ref': 'Person.json'})
+        self.assertEqual(list(index['x-shards'].keys()), sharded.names)
+        self.assertEqual(index['x-shards']['Picture']['path'],
+                         'Picture.json')
+        picture_hash = index['x-shards']['Picture']['hash']
+        sharded.invalidate('Picture')
+        self.assertEqual(sharded.lazy['definitions'].converted,
+                         ['Person', 'Observation'])
+        self.assertEqual(sharded.index()['x-shards']['Picture']['hash'],
+                         picture_hash)
+        directory = tempfile.mkdtemp()
+        try:
+            sharded.write(directory)
+            self.assertEqual(sorted(os.listdir(directory)),
+                             ['Observation.json', 'Person.json',
+                              'Picture.json', 'index.json'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_convert_forms(self):
+        stats = ConversionStats(engine=db.engine)
+        self.converter.add_tracer(stats)
+        add = self.converter.convert(PersonView, 'add')
+        queries = stats.queries
+        edit = self.converter.convert(PersonView, 'edit')
+        queries += stats.queries
+        schemas = self.converter.convert_forms(PersonView)
+        self.assertEqual(list(schemas.keys()), ['add', 'edit'])
+        self.assertEqual(schemas['add'], add)
+        self.assertEqual(schemas['edit'], edit)
+        # Both form types of both views are converted from one instance
+        self.assertEqual(stats.views, 4)
+        self.assertEqual(stats.view_inits, 2)
+        # name, dt and person_type of Person, all three fields of Picture
+        self.assertEqual(stats.cache_hits['fields'], 6)
+        self.assertLess(stats.queries, queries)
+        # The schemas don't share their properties
+        add_type = schemas['add']['definitions']['Person']['properties'][
+            'person_type']
+        self.assertIsNot(add_type, schemas['edit']['definitions']['Person'][
+            'properties']['person_type'])
+
+    def test_convert_forms_query_filters(self):
+        class FilteredPersonView(PersonView):
+            add_form_query_rel_fields = {
+                'person_type': [['name', FilterEqual, 'male']]}
+
+        def person_types(schema):
+            return schema['definitions']['Person']['properties'][
+                'person_type']['enum']
+        add = self.converter.convert(FilteredPersonView, 'add')
+        edit = self.converter.convert(FilteredPersonView, 'edit')
+        self.assertEqual(len(person_types(add)), 1)
+        self.assertEqual(len(person_types(edit)), 2)
+        schemas = self.converter.convert_forms(FilteredPersonView)
+        self.assertEqual(schemas['add'], add)
+        self.assertEqual(schemas['edit'], edit)
+
+    def test_choice_labels(self):
+        loaded = []
+
+        def load(target, context):
+            loaded.append(target)
+        label = func.coalesce(PersonType.name, literal('Person Type ') +
+                              cast(PersonType.id, String))
+        converter = FABConverter(choice_labels={Person.person_type: label})
+        stats = ConversionStats()
+        converter.add_tracer(stats)
+        event.listen(PersonType, 'load', load)
+        try:
+            schema = converter.convert([PersonView, ObservationView])
+            misses = dict(stats.cache_misses)
+            refreshable = RefreshableSchema(converter, PersonView)
+            self.db.session.add(PersonType(name='female'))
+            self.db.session.commit()
+            refreshable.refresh()
+        finally:
+            event.remove(PersonType, 'load', load)
+        self.assertEqual(loaded, [])
+        self.assertEqual(schema, person_observation_schema)
+        self.assertEqual(misses['choices'], 1)
+        self.assertEqual(refreshable.schema['definitions']['Person'][
+            'properties']['person_type']['enum'][2],
+            {'id': '3', 'label': 'female'})
+        # Labels can be declared per related model as well
+        converter = FABConverter(choice_labels={PersonType: 'id'})
+        schema = converter.convert(PersonView)
+        self.assertEqual(schema['definitions']['Person']['properties'][
+            'person_type']['enum'], [{'id': '1', 'label': '1'},
+                                     {'id': '2', 'label': '2'},
+                                     {'id': '3', 'label': '3'}])
+
+    def test_profile(self):
+        report = profile_views(self.converter, [PersonView, ObservationView],
+                               form_types=('add', 'edit'), engine=db.engine)
+        self.assertEqual([(p.view, p.form_type) for p in report.views],
+                         [(PersonView, 'add'), (PersonView, 'edit'),
+                          (ObservationView, 'add'),
+                          (ObservationView, 'edit')])
+        person = report.views[0]
+        self.assertEqual(person.view_inits, 2)
+        self.assertGreater(person.queries, 0)
+        self.assertGreater(person.allocated, 0)
+        self.assertEqual(self.converter.tracers, [])
+        methods = dict((m[0], m[1]) for m in report.methods)
+        self.assertEqual(methods['query_select_field'], 4)
+        self.assertEqual(report.enums[('Person', 'person_type')], 2)
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.assertEqual(profile.main(['tests.test_fab:appbuilder',
+                                           '--top', '3']), 0)
+        self.assertIn('Views by time', out.getvalue())
+        self.assertIn('query_select_field', out.getvalue())
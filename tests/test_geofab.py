@@ -1,11 +1,13 @@
 from pprint import pprint
 from collections import OrderedDict
 from wtforms_jsonschema2.geofab import GeoFABConverter
+from tests.test_base import convert_concurrently
 from unittest import TestCase
 from flask_appbuilder import AppBuilder
 from fab_addon_geoalchemy.models import GeoSQLAInterface, Geometry
 from flask import Flask
 from fab_addon_geoalchemy.views import GeoModelView
+from fab_addon_geoalchemy.fields import PointField
 from sqlalchemy import Column, Integer, String
 from sqlalchemy import MetaData, create_engine
 from flask_sqlalchemy import SQLAlchemy
@@ -120,3 +122,15 @@ class TestGeoFABFormConvert(TestCase):
         pprint(schema)
         pprint(observation_schema)
         self.assertDictEqual(schema, observation_schema)
+
+    def test_shared_converter(self):
+        expected = self.converter.dumps(
+            self.converter.convert(GeoObservationView))
+        schemas = convert_concurrently(self.converter, GeoObservationView,
+                                       threads=8, repeat=10,
+                                       context=app.app_context)
+        self.assertEqual(len(schemas), 80)
+        self.assertEqual(set(schemas), set([expected]))
+        # The forms of the views keep their PointFields
+        self.assertIs(GeoObservationView().add_form.location.field_class,
+                      PointField)
@@ -0,0 +1,83 @@
+from contextlib import contextmanager
+from unittest import TestCase
+from flask_babel.speaklater import LazyString
+from wtforms.form import Form
+from wtforms.fields import StringField, SelectField, IntegerField
+from wtforms_jsonschema2.base import BaseConverter
+from wtforms_jsonschema2.i18n import LocalizedSchemaCache, localize
+from wtforms_jsonschema2.versioning import HASH_KEY, schema_hash
+
+TRANSLATIONS = {
+    'nl': {'Name': 'Naam', 'Your name': 'Uw naam', 'Apple': 'Appel'},
+    'de': {'Name': 'Name', 'Your name': 'Ihr Name', 'Apple': 'Apfel'},
+}
+current = {'locale': 'en', 'lookups': 0}
+
+
+def _gettext(text):
+    current['lookups'] += 1
+    return TRANSLATIONS.get(current['locale'], {}).get(text, text)
+
+
+def lazy_gettext(text):
+    return LazyString(_gettext, text)
+
+
+@contextmanager
+def force_locale(locale):
+    old = current['locale']
+    current['locale'] = locale
+    try:
+        yield
+    finally:
+        current['locale'] = old
+
+
+class FruitForm(Form):
+    name = StringField(lazy_gettext('Name'),
+                       description=lazy_gettext('Your name'))
+    fruit = SelectField('Fruit', choices=[('apple', lazy_gettext('Apple')),
+                                          ('pear', 'Pear')])
+    size = IntegerField('Size')
+
+
+class CountingConverter(BaseConverter):
+    conversions = 0
+
+    def convert(self, form):
+        self.conversions += 1
+        return super().convert(form)
+
+
+class TestLocalizedSchemaCache(TestCase):
+    def setUp(self):
+        self.converter = CountingConverter(stamp_hash=True)
+        self.cache = LocalizedSchemaCache(self.converter, force_locale)
+
+    def test_locales(self):
+        nl = self.cache.get(FruitForm, 'nl')
+        self.assertEqual(nl['properties']['name']['title'], 'Naam')
+        self.assertEqual(nl['properties']['name']['description'], 'Uw naam')
+        self.assertEqual(nl['properties']['fruit']['enum'][0][1], 'Appel')
+        de = self.cache.get(FruitForm, 'de')
+        self.assertEqual(de['properties']['name']['description'], 'Ihr Name')
+        self.assertEqual(de['properties']['fruit']['enum'][0][1], 'Apfel')
+        self.assertEqual(self.converter.conversions, 1)
+        self.assertEqual(de[HASH_KEY], schema_hash(de))
+        self.assertNotEqual(de[HASH_KEY], nl[HASH_KEY])
+
+    def test_cached(self):
+        schema = self.cache.get(FruitForm, 'nl')
+        lookups = current['lookups']
+        self.assertIs(self.cache.get(FruitForm, 'nl'), schema)
+        self.assertEqual(current['lookups'], lookups)
+        self.cache.clear()
+        self.assertIsNot(self.cache.get(FruitForm, 'nl'), schema)
+        self.assertEqual(self.converter.conversions, 2)
+
+    def test_localize_shares_subtrees(self):
+        structure = self.cache.structure(FruitForm)
+        schema = localize(structure)
+        self.assertIs(schema['properties']['size'],
+                      structure['properties']['size'])
+        self.assertIsNot(schema['properties'], structure['properties'])
@@ -0,0 +1,69 @@
+from importlib.metadata import EntryPoint
+from unittest import TestCase
+from wtforms.fields import Field, StringField
+from wtforms.form import Form
+from wtforms_jsonschema2 import registry
+from wtforms_jsonschema2.base import BaseConverter, FieldSpec
+
+
+class ColorField(Field):
+    pass
+
+
+class SizeField(Field):
+    pass
+
+
+class PluginForm(Form):
+    color = ColorField('Color')
+    size = SizeField('Size')
+
+
+def convert_color(converter, field):
+    return FieldSpec('string', {'format': 'color'})
+
+
+def convert_size(converter, field):
+    return FieldSpec('integer', {'minimum': 0})
+
+
+def convert_string(converter, field):
+    return FieldSpec('boolean')
+
+
+class TestRegistry(TestCase):
+    def setUp(self):
+        self.entry_points = registry._entry_points
+        registry._entry_points = {}
+
+    def tearDown(self):
+        registry._entry_points = self.entry_points
+        for cls in (ColorField, SizeField, StringField):
+            registry.unregister_converter(cls)
+
+    def test_register_converter(self):
+        registry.register_converter(ColorField, convert_color)
+        registry.register_converter(__name__ + '.SizeField', convert_size)
+        schema = BaseConverter().convert(PluginForm)
+        self.assertEqual(schema['properties']['color']['format'], 'color')
+        self.assertEqual(schema['properties']['size']['type'], 'integer')
+
+    def test_entry_point(self):
+        for name, func in (('ColorField', 'convert_color'),
+                           ('SizeField', 'convert_size')):
+            registry._entry_points[__name__ + '.' + name] = EntryPoint(
+                __name__ + '.' + name, __name__ + ':' + func,
+                registry.ENTRY_POINT_GROUP)
+        registry.register_converter(SizeField, convert_color)
+        schema = BaseConverter().convert(PluginForm)
+        self.assertEqual(schema['properties']['color']['format'], 'color')
+        # Runtime registrations take precedence over entry points
+        self.assertEqual(schema['properties']['size']['format'], 'color')
+
+    def test_precedence(self):
+        registry.register_converter(StringField, convert_string)
+
+        class StringForm(Form):
+            name = StringField()
+        schema = BaseConverter().convert(StringForm)
+        self.assertEqual(schema['properties']['name']['type'], 'string')
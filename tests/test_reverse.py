@@ -0,0 +1,96 @@
+from collections import OrderedDict
+from wtforms_jsonschema2.base import BaseConverter
+from wtforms_jsonschema2.exceptions import UnsupportedSchemaException
+from wtforms_jsonschema2.reverse import FormFactory, form_class
+from wtforms_jsonschema2.utils import _copy_tree
+from unittest import TestCase
+from werkzeug.datastructures import MultiDict
+from wtforms.fields import SelectField, SelectMultipleField
+from tests.test_base import (StringTestForm, SimpleTestForm, ContactForm,
+                             FieldListForm)
+
+
+class TestReverseConvert(TestCase):
+    def setUp(self):
+        self.converter = BaseConverter()
+        self.factory = FormFactory()
+        self.maxDiff = None
+
+    def test_round_trip(self):
+        for form in [StringTestForm, SimpleTestForm, ContactForm,
+                     FieldListForm]:
+            schema = self.converter.convert(form)
+            self.assertEqual(
+                self.converter.convert(self.factory.form_class(schema)),
+                schema)
+
+    def test_subform_refs(self):
+        converter = BaseConverter(subform_refs=True)
+        schema = converter.convert(ContactForm)
+        cls = self.factory.form_class(schema)
+        self.assertEqual(converter.convert(cls), schema)
+        # Both addresses refer to the same definition
+        self.assertIs(cls.home.args[0], cls.work.args[0])
+
+    def test_validation(self):
+        cls = self.factory.form_class(SimpleTestForm._schema,
+                                      name='Simple')
+        self.assertEqual(cls.__name__, 'SimpleForm')
+        form = cls(MultiDict({'first_name': 'Jan', 'age': '5',
+                              'gender': 'Male', 'some_field2': '2.2'}))
+        self.assertTrue(form.validate(), form.errors)
+        self.assertEqual(form.some_field2.data, 2.2)
+        form = cls(MultiDict({'age': '11', 'gender': 'Unknown'}))
+        self.assertFalse(form.validate())
+        self.assertEqual(sorted(form.errors.keys()),
+                         ['age', 'first_name', 'gender'])
+
+    def test_cache(self):
+        schema = self.converter.convert(ContactForm)
+        cls = self.factory.form_class(schema)
+        self.assertIs(self.factory.form_class(_copy_tree(schema)), cls)
+        self.assertIs(self.factory.form_class(
+            self.converter.convert(ContactForm)), cls)
+        self.assertEqual(len(self.factory), 1)
+        changed = _copy_tree(schema)
+        changed['properties']['home']['properties']['city'][
+            'maxLength'] = 100
+        self.assertIsNot(self.factory.form_class(changed), cls)
+        self.assertIs(form_class(schema), form_class(schema))
+
+    def test_definitions(self):
+        # Like the definitions of Flask Appbuilder views
+        schema = OrderedDict([
+            ('type', 'object'),
+            ('definitions', OrderedDict([
+                ('Person', OrderedDict([
+                    ('type', 'object'),
+                    ('properties', OrderedDict([
+                        ('person_type', {
+                            'title': 'Person Type',
+                            'type': 'object',
+                            'enum': [{'id': '1', 'label': 'male'},
+                                     {'id': '2', 'label': 'female'}]}),
+                        ('groups', {
+                            'type': 'array',
+                            'title': 'Groups',
+                            'items': [{'type': 'object',
+                                       'enum': [{'id': '1', 'label': 'a'}]}]
+                        }),
+                    ])),
+                    ('required', ['person_type']),
+                    ('title', 'Person')
+                ]))
+            ])),
+            ('properties', {'Person': {'$ref': '#/definitions/Person'}})
+        ])
+        cls = self.factory.form_class(schema, 'Person')
+        self.assertEqual(cls.__name__, 'PersonForm')
+        form = cls()
+        self.assertIsInstance(form.person_type, SelectField)
+        self.assertEqual(form.person_type.choices,
+                         [('1', 'male'), ('2', 'female')])
+        self.assertIsInstance(form.groups, SelectMultipleField)
+        with self.assertRaises(UnsupportedSchemaException):
+            self.factory.form_class({'type': 'object', 'properties': {
+                'x': {'type': 'null'}}})
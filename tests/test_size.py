@@ -0,0 +1,86 @@
+import io
+import json
+import os
+import tempfile
+from contextlib import redirect_stdout
+from wtforms_jsonschema2.base import BaseConverter
+from wtforms_jsonschema2.exceptions import SchemaBudgetExceeded
+from wtforms_jsonschema2.size import analyze, check_budget, main
+from unittest import TestCase
+from tests.test_dedup import ContactForm, countries
+
+
+def compact_size(node):
+    return len(json.dumps(node, separators=(',', ':')).encode('utf-8'))
+
+
+class TestSize(TestCase):
+    def setUp(self):
+        self.converter = BaseConverter()
+        self.schema = self.converter.convert(ContactForm)
+        self.maxDiff = None
+
+    def test_analyze(self):
+        report = analyze(self.schema)
+        self.assertEqual(report.total, compact_size(self.schema))
+        properties = self.schema['properties']
+        self.assertEqual(report.properties['/properties/home'],
+                         compact_size(properties['home']))
+        self.assertEqual(
+            report.properties['/properties/home/properties/street'],
+            compact_size(properties['home']['properties']['street']))
+        self.assertEqual(report.enums['/properties/nationality'],
+                         (compact_size(countries), len(countries)))
+        self.assertEqual(report.largest(1),
+                         [('/properties/home',
+                           compact_size(properties['home']))])
+        kinds = [(kind, pointers) for kind, pointers, size, wasted
+                 in report.duplicates]
+        self.assertIn(('object', ['/properties/home', '/properties/work']),
+                      kinds)
+        self.assertIn(('enum', ['/properties/nationality',
+                                '/properties/home/properties/country',
+                                '/properties/work/properties/country']),
+                      kinds)
+        kind, pointers, size, wasted = report.duplicates[0]
+        self.assertEqual(wasted, size * (len(pointers) - 1))
+        self.assertIn('Duplicated subtrees', report.format())
+
+    def test_definitions(self):
+        schema = {'type': 'object',
+                  'definitions': {'Contact': self.schema},
+                  'properties': {
+                      'Contact': {'$ref': '#/definitions/Contact'}}}
+        report = analyze(schema)
+        self.assertEqual(report.definitions,
+                         {'Contact': compact_size(self.schema)})
+        self.assertIn('/definitions/Contact/properties/name',
+                      report.properties)
+
+    def test_budget(self):
+        size = compact_size(self.schema)
+        self.assertEqual(check_budget(self.schema, budget=size), [])
+        with self.assertLogs('wtforms_jsonschema2.size', 'WARNING'):
+            self.assertEqual(check_budget(self.schema, budget=100),
+                             [(None, size, 100)])
+        schema = {'definitions': {'Contact': self.schema,
+                                  'Other': {'type': 'object'}}}
+        with self.assertRaises(SchemaBudgetExceeded) as cm:
+            check_budget(schema, definition_budgets={'*': 100},
+                         on_budget='raise')
+        self.assertEqual(cm.exception.exceeded, [('Contact', size, 100)])
+        self.assertEqual(check_budget(schema, definition_budgets={
+            '*': 100, 'Contact': size}), [])
+
+    def test_main(self):
+        fd, path = tempfile.mkstemp(suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.converter.dumps(self.schema))
+            out = io.StringIO()
+            with redirect_stdout(out):
+                self.assertEqual(main([path]), 0)
+                self.assertEqual(main([path, '--budget', '100']), 1)
+            self.assertIn('OVER BUDGET: schema', out.getvalue())
+        finally:
+            os.unlink(path)
@@ -0,0 +1,90 @@
+import threading
+import unittest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import NullPool
+from wtforms import Form
+from wtforms.fields import StringField, IntegerField, FormField, SelectField
+from wtforms_jsonschema2.base import BaseConverter, converts
+from wtforms_jsonschema2.stats import ConversionStats
+
+
+class AddressForm(Form):
+    street = StringField()
+    number = IntegerField()
+
+
+class ContactForm(Form):
+    home = FormField(AddressForm)
+    work = FormField(AddressForm)
+    kind = SelectField(choices=[('a', 'A'), ('b', 'B'), ('c', 'C')])
+
+
+class QueryConverter(BaseConverter):
+    """Issues a query for every IntegerField."""
+
+    def __init__(self, engine, **kwargs):
+        super().__init__(**kwargs)
+        self.engine = engine
+
+    @converts(IntegerField)
+    def integer_field(self, field):
+        with self.engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+        return super().integer_field(field)
+
+
+class TestConversionStats(unittest.TestCase):
+    def setUp(self):
+        self.converter = BaseConverter()
+        self.stats = ConversionStats()
+        self.converter.add_tracer(self.stats)
+
+    def test_stats(self):
+        self.converter.convert(ContactForm)
+        self.assertEqual(self.stats.views, 0)
+        self.assertEqual(self.stats.form_inits, 1)
+        self.assertEqual(self.stats.fields['string_field'], 1)
+        self.assertEqual(self.stats.fields['integer_field'], 1)
+        self.assertEqual(self.stats.fields['select_field'], 1)
+        self.assertEqual(self.stats.cache_misses['subforms'], 1)
+        self.assertEqual(self.stats.cache_hits['subforms'], 1)
+        self.assertEqual(self.stats.enums[(None, 'kind')], 3)
+        self.assertEqual(self.stats.queries, 0)
+
+    def test_reset(self):
+        self.converter.convert(ContactForm)
+        self.converter.convert(ContactForm)
+        self.assertEqual(self.stats.form_inits, 1)
+        self.assertEqual(self.stats.as_dict()['fields']['select_field'], 1)
+
+    def test_threads(self):
+        # Every thread uses connections of its own
+        engine = create_engine('sqlite://', poolclass=NullPool)
+        engine.connect().close()
+        converter = QueryConverter(engine)
+        stats = ConversionStats(engine=engine, query_budget=1,
+                                on_budget='raise')
+        converter.add_tracer(stats)
+        barrier = threading.Barrier(8)
+        results = []
+
+        def run():
+            barrier.wait()
+            for i in range(10):
+                # One or two subforms, so the threads count differently
+                form = ContactForm if i % 2 else AddressForm
+                converter.convert(form)
+                results.append((form, stats.queries,
+                                stats.fields['integer_field']))
+        workers = [threading.Thread(target=run) for i in range(8)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(len(results), 80)
+        self.assertEqual(set(results), set([(AddressForm, 1, 1),
+                                            (ContactForm, 1, 1)]))
+        self.assertFalse(event.contains(engine, 'before_cursor_execute',
+                                        stats._count_query))
+        # This thread doesn't see the statistics of the other threads
+        self.assertEqual(stats.queries, 0)
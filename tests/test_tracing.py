@@ -0,0 +1,73 @@
+from wtforms_jsonschema2.base import BaseConverter
+from wtforms_jsonschema2.tracing import Tracer, TimingTracer, NO_SPAN
+from unittest import TestCase
+from wtforms.form import Form
+from wtforms.fields import StringField, IntegerField, FormField
+
+
+class AddressForm(Form):
+    street = StringField('Street')
+
+
+class PersonForm(Form):
+    name = StringField('Name')
+    age = IntegerField('Age')
+    address = FormField(AddressForm)
+
+
+class RecordingTracer(Tracer):
+    def __init__(self):
+        self.events = []
+
+    def start(self, span):
+        self.events.append(('start', span.kind, span.name,
+                            span.parent.kind if span.parent else None))
+
+    def end(self, span):
+        self.events.append(('end', span.kind, span.name))
+
+
+class TestTracing(TestCase):
+    def test_no_tracers(self):
+        converter = BaseConverter()
+        self.assertIs(converter._span('field', 'name'), NO_SPAN)
+
+    def test_spans(self):
+        converter = BaseConverter()
+        tracer = RecordingTracer()
+        converter.add_tracer(tracer)
+        converter.convert(PersonForm)
+        self.assertEqual(tracer.events, [
+            ('start', 'convert', 'PersonForm', None),
+            ('start', 'form', 'PersonForm', 'convert'),
+            ('start', 'form_init', 'PersonForm', 'form'),
+            ('end', 'form_init', 'PersonForm'),
+            ('start', 'field', 'name', 'form'),
+            ('end', 'field', 'name'),
+            ('start', 'field', 'age', 'form'),
+            ('end', 'field', 'age'),
+            ('start', 'field', 'address', 'form'),
+            ('start', 'form', 'AddressForm', 'field'),
+            ('start', 'field', 'street', 'form'),
+            ('end', 'field', 'street'),
+            ('end', 'form', 'AddressForm'),
+            ('end', 'field', 'address'),
+            ('end', 'form', 'PersonForm'),
+            ('end', 'convert', 'PersonForm'),
+        ])
+        self.assertIsNone(converter._current_span)
+        converter.remove_tracer(tracer)
+        self.assertEqual(converter.tracers, [])
+
+    def test_timing_tracer(self):
+        converter = BaseConverter()
+        tracer = TimingTracer()
+        converter.add_tracer(tracer)
+        converter.convert(PersonForm)
+        self.assertEqual(list(tracer.kinds.keys()),
+                         ['form_init', 'field', 'form', 'convert'])
+        self.assertEqual(list(tracer.fields.keys()),
+                         [(None, 'name'), (None, 'age'), (None, 'street'),
+                          (None, 'address')])
+        self.assertTrue(all(t >= 0 for t in tracer.fields.values()))
+        self.assertEqual(len(tracer.slowest_fields(2)), 2)
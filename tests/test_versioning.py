@@ -0,0 +1,72 @@
+from collections import OrderedDict
+from copy import deepcopy
+from wtforms_jsonschema2.base import BaseConverter
+from wtforms_jsonschema2.versioning import (HASH_KEY, schema_hash, stamp,
+                                            make_patch, apply_patch,
+                                            SchemaHistory)
+from unittest import TestCase
+from wtforms.form import Form
+from wtforms.fields import StringField, SelectField
+
+
+class CountryForm(Form):
+    name = StringField('Name')
+    country = SelectField('Country', choices=['Netherlands', 'Belgium'])
+
+
+class TestVersioning(TestCase):
+    def setUp(self):
+        self.maxDiff = None
+        self.converter = BaseConverter()
+        self.old = self.converter.convert(CountryForm)
+        self.new = deepcopy(self.old)
+        self.new['properties']['country']['enum'].insert(1, 'Germany')
+
+    def test_schema_hash(self):
+        reordered = OrderedDict(reversed(list(self.old.items())))
+        self.assertEqual(schema_hash(self.old), schema_hash(reordered))
+        self.assertNotEqual(schema_hash(self.old), schema_hash(self.new))
+        version = stamp(self.old)
+        self.assertEqual(self.old[HASH_KEY], version)
+        self.assertEqual(schema_hash(self.old), version)
+
+    def test_stamp_hash(self):
+        converter = BaseConverter(stamp_hash=True)
+        schema = converter.convert(CountryForm)
+        self.assertEqual(schema[HASH_KEY], schema_hash(self.old))
+
+    def test_make_patch(self):
+        patch = make_patch(self.old, self.new)
+        self.assertEqual(patch, [{'op': 'add',
+                                  'path': '/properties/country/enum/1',
+                                  'value': 'Germany'}])
+        self.assertEqual(apply_patch(self.old, patch), self.new)
+        self.assertEqual(apply_patch(self.new, make_patch(self.new,
+                                                          self.old)),
+                         self.old)
+        self.assertEqual(make_patch(self.old, deepcopy(self.old)), [])
+
+    def test_patch_keys(self):
+        old = {'a/b': 1, 'c': {'d': True}, 'e': [1, 2, 3], 'f': 1}
+        new = {'a/b': 2, 'c': {'d': 1}, 'e': [3], 'g': None}
+        patch = make_patch(old, new)
+        self.assertIn({'op': 'replace', 'path': '/a~1b', 'value': 2}, patch)
+        self.assertIn({'op': 'replace', 'path': '/c/d', 'value': 1}, patch)
+        self.assertEqual(apply_patch(old, patch), new)
+
+    def test_history(self):
+        history = SchemaHistory(max_versions=2)
+        old_version = history.add(self.old)
+        self.assertEqual(history.delta()['schema'], self.old)
+        new_version = history.add(self.new)
+        self.assertEqual(history.current, new_version)
+        delta = history.delta(old_version)
+        self.assertEqual(delta['hash'], new_version)
+        self.assertEqual(apply_patch(self.old, delta['patch']), self.new)
+        self.assertEqual(history.delta(new_version)['patch'], [])
+        self.assertEqual(history.delta('unknown')['schema'], self.new)
+        newer = deepcopy(self.new)
+        newer['properties']['name']['maxLength'] = 100
+        history.add(newer)
+        self.assertNotIn(old_version, history.versions)
+        self.assertEqual(history.delta(old_version)['schema'], newer)
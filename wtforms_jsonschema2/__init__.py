@@ -1 +1,29 @@
+import sys
+import types
 from .version import version as __version__
+
+# The converters are imported on first access, so importing the package
+# doesn't import Flask Appbuilder or GeoAlchemy.
+_converters = {
+    'BaseConverter': 'base',
+    'FABConverter': 'fab',
+    'GeoFABConverter': 'geofab',
+}
+
+
+class _LazyModule(types.ModuleType):
+    """
+    The class of this package, which imports the converters on first
+    access. Module level __getattr__ (PEP 562) needs python 3.7.
+    """
+
+    def __getattr__(self, name):
+        if name in _converters:
+            from importlib import import_module
+            module = import_module('.' + _converters[name], __name__)
+            return getattr(module, name)
+        raise AttributeError('module {!r} has no attribute {!r}'.format(
+            __name__, name))
+
+
+sys.modules[__name__].__class__ = _LazyModule
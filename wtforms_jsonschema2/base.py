@@ -1,39 +1,307 @@
 from wtforms.form import FormMeta
 from wtforms.fields.core import (StringField, IntegerField, DateTimeField,
                                  SelectField, DecimalField, FormField,
-                                 BooleanField)
+                                 BooleanField, FieldList, UnboundField)
 from wtforms.validators import (Required, InputRequired, NumberRange, Length,
                                 Email, DataRequired)
 from decimal import Decimal
 import logging
+import json
+import threading
+import weakref
 from .exceptions import UnsupportedFieldException
+from .fingerprint import describe
+from .utils import _copy_tree, _json_default, _loaded_class
+from .versioning import stamp
+from .tracing import Span, NO_SPAN
+from . import registry
 from collections import OrderedDict
+from contextlib import contextmanager
+from types import MethodType
 from wtforms.fields import TextAreaField
 
 log = logging.getLogger(__name__)
 
+# The converter methods per converter class, see _converter_table(). Keyed
+# weakly, so converter classes created at runtime can be garbage collected.
+_converter_tables = weakref.WeakKeyDictionary()
+
 
 def converts(*args):
+    """
+    Register the decorated method as the converter for the passed field
+    classes. Classes of optional dependencies can be passed by their dotted
+    path instead, like 'flask_appbuilder.fields.EnumField', so they don't
+    need to be imported. They are resolved once the module of the class has
+    been imported by someone else.
+    """
     def _inner(func):
         func._converter_for = frozenset(args)
         return func
     return _inner
 
 
+def dynamic(func):
+    """
+    Mark a converter whose result can change while the application runs,
+    like the choices of a field that are loaded from the database. The
+    properties it produces can be refreshed without converting the whole
+    schema again, see wtforms_jsonschema2.refresh.
+    """
+    func._dynamic = True
+    return func
+
+
+class FieldSpec(object):
+    """
+    The result of converting a single field: the JSONSchema type, a dict
+    with additional options for the field like enum, and whether the
+    field is required.
+
+    Converters used to return a (fieldtype, options, required) tuple, which
+    is still accepted. A FieldSpec can be unpacked like that tuple as well.
+    """
+    __slots__ = ('fieldtype', 'options', 'required')
+
+    def __init__(self, fieldtype, options=None, required=False):
+        self.fieldtype = fieldtype
+        self.options = options
+        self.required = required
+
+    @classmethod
+    def from_result(cls, result):
+        """Turn the return value of a converter into a FieldSpec."""
+        if isinstance(result, cls):
+            return result
+        return cls(*result)
+
+    def __iter__(self):
+        yield self.fieldtype
+        yield self.options if self.options is not None else {}
+        yield self.required
+
+    def __repr__(self):
+        return 'FieldSpec({!r}, {!r}, {!r})'.format(
+            self.fieldtype, self.options, self.required)
+
+    def to_schema(self, dict_class=dict):
+        """
+        Return the JSONSchema property for this field, without title. This
+        is the single copy made of the options, so converters can return
+        the same dict of options for several fields.
+        """
+        d = dict_class()
+        if self.fieldtype is not None:
+            d['type'] = self.fieldtype
+        if self.options:
+            d.update(self.options)
+        return d
+
+
+def _converter_table(cls):
+    """
+    Return the converter methods of a converter class as a tuple of two
+    dicts, mapping field classes and dotted paths of field classes that are
+    not resolved yet to method names. The table is built once per class.
+    """
+    table = _converter_tables.get(cls)
+    if table is None:
+        attrs = {}
+        for klass in reversed(cls.__mro__):
+            attrs.update(vars(klass))
+        classes, paths = {}, {}
+        for name, obj in sorted(attrs.items()):
+            for target in getattr(obj, '_converter_for', ()):
+                if isinstance(target, str):
+                    paths[target] = name
+                else:
+                    classes[target] = name
+        table = _converter_tables.setdefault(cls, (classes, paths))
+    return table
+
+
+def _conversion_state(name):
+    """
+    A converter attribute holding state of the conversion that is running
+    in the current thread, so a converter can be shared between threads.
+    """
+    def fget(self):
+        return getattr(self._local, name, None)
+
+    def fset(self, value):
+        setattr(self._local, name, value)
+    return property(fget, fset)
+
+
+def _inline_refs(node, definitions):
+    """
+    Return a copy of node in which the references to definitions are
+    replaced by (copies of) the definitions, keeping the title and other
+    keys next to the $ref.
+    """
+    if isinstance(node, dict):
+        ref = node.get('$ref')
+        if isinstance(ref, str) and ref.startswith('#/definitions/') and \
+                ref[len('#/definitions/'):] in definitions:
+            inlined = _inline_refs(definitions[ref[len('#/definitions/'):]],
+                                   definitions)
+            for k, v in node.items():
+                if k != '$ref':
+                    inlined[k] = v
+            return inlined
+        return node.__class__((k, _inline_refs(v, definitions))
+                              for k, v in node.items())
+    if isinstance(node, list):
+        return [_inline_refs(item, definitions) for item in node]
+    return node
+
+
+class SharedFields(object):
+    """
+    Field conversions shared between the conversions of similar forms, like
+    the add and edit forms of a view. A field is converted once for all
+    forms that have a field with the same name and the same unbound field
+    (class, arguments and validators) within the same scope, like a view.
+    """
+
+    def __init__(self):
+        self.scope = None
+        # _shared_key() of a field, like (scope, name, description of the
+        # unbound field) -> (schema, required)
+        self.fields = {}
+        # Instances of views by class, for converters of views
+        self.views = {}
+
+
 class BaseConverter(object):
     """
     The FormConverter converts wtforms to JSONSchema which can be
     communicated with other applications, and turned back into forms there.
+
+    Subforms of FormFields are converted once per form class during a
+    conversion. If subform_refs is True, they are added to the definitions
+    of the schema and referred to with a $ref instead of being inlined.
+
+    In compact mode the schema is built from plain dicts instead of
+    OrderedDicts and dumps() leaves out all whitespace. If titles is False,
+    titles and descriptions are left out of the schema, which is useful for
+    consumers that are not showing the schema to humans.
+
+    If stamp_hash is True, every schema carries its canonical content hash
+    (see wtforms_jsonschema2.versioning).
+
+    Tracers (see wtforms_jsonschema2.tracing) added with add_tracer() are
+    notified of the start and end of every part of a conversion.
+
+    A converter can be shared between threads: the state of a conversion
+    is kept per thread.
     """
+    _subforms = _conversion_state('subforms')
+    _definitions = _conversion_state('definitions')
+    # A list of (property, field) of dynamic converters while recording.
+    _dynamic = _conversion_state('dynamic')
+    _current_span = _conversion_state('current_span')
+    # SharedFields while converting several forms at once.
+    _shared = _conversion_state('shared')
 
-    def __init__(self, skip_fields=['csrf_token']):
-        self.converters = {}
+    def __init__(self, skip_fields=['csrf_token'], subform_refs=False,
+                 compact=False, titles=True, stamp_hash=False):
+        # The converter methods per field class. Keyed weakly, so field
+        # classes created at runtime can be garbage collected.
+        self.converters = weakref.WeakKeyDictionary()
         self.skip_fields = skip_fields
-        for name in dir(self):
-            obj = getattr(self, name)
-            if hasattr(obj, '_converter_for'):
-                for classname in obj._converter_for:
-                    self.converters[classname] = obj
+        self.subform_refs = subform_refs
+        self.compact = compact
+        self.titles = titles
+        self.stamp_hash = stamp_hash
+        # Since python 3.7 plain dicts keep their order as well, but they
+        # use less memory than OrderedDicts.
+        self._dict = dict if compact else OrderedDict
+        self._local = threading.local()
+        self.tracers = []
+        classes, _ = _converter_table(self.__class__)
+        for cls, name in list(classes.items()):
+            self.converters[cls] = getattr(self, name)
+
+    def _find_converter(self, cls):
+        """
+        Return the converter method for a field class, or None if there is
+        none. Converters registered by dotted path and converters from the
+        registry (see wtforms_jsonschema2.registry) are resolved here.
+        """
+        converter = self.converters.get(cls)
+        if converter is None:
+            classes, paths = _converter_table(self.__class__)
+            for path, name in list(paths.items()):
+                target = _loaded_class(path)
+                if target is not None:
+                    log.debug('Resolved %s', path)
+                    classes.setdefault(target, name)
+                    paths.pop(path, None)
+            if cls in classes:
+                converter = getattr(self, classes[cls])
+            else:
+                func = registry.find_converter(cls)
+                if func is not None:
+                    converter = MethodType(func, self)
+            if converter is not None:
+                self.converters[cls] = converter
+        return converter
+
+    def add_tracer(self, tracer):
+        """Add a tracer that is notified of the spans of conversions."""
+        self.tracers.append(tracer)
+
+    def remove_tracer(self, tracer):
+        self.tracers.remove(tracer)
+
+    def _span(self, kind, name, obj=None):
+        """
+        Return a context manager for a span of a conversion. Without
+        tracers, this is a shared object that does nothing.
+        """
+        if not self.tracers:
+            return NO_SPAN
+        return Span(self, kind, name, obj)
+
+    def _event(self, kind, name, obj=None):
+        """
+        Notify the tracers of an event. Check self.tracers before calling
+        this, to save building the arguments when there are no tracers.
+        """
+        for tracer in self.tracers:
+            tracer.event(self._current_span, kind, name, obj)
+
+    @contextmanager
+    def _conversion(self):
+        """
+        Keep track of the state of a single conversion. Nested calls share
+        the state of the outermost call, which is the only one that yields
+        True and is responsible for finishing the schema.
+        """
+        if self._subforms is not None:
+            yield False
+            return
+        self._subforms = {}
+        self._definitions = self._dict()
+        try:
+            yield True
+        finally:
+            self._subforms = None
+            self._definitions = None
+
+    def _finish(self, schema):
+        """
+        Add the definitions collected during the conversion to schema and
+        stamp it with its hash.
+        """
+        if len(self._definitions) > 0:
+            if 'definitions' not in schema:
+                schema['definitions'] = self._dict()
+            for name, defin in self._definitions.items():
+                schema['definitions'][name] = defin
+        if self.stamp_hash:
+            stamp(schema)
 
     def _is_required(self, vals):
         return InputRequired in vals.keys() or Required in vals.keys() or \
@@ -45,7 +313,7 @@ class BaseConverter(object):
         vals = dict([(v.__class__, v) for v in field.validators])
         required = self._is_required(vals)
 
-        return fieldtype, {}, required
+        return FieldSpec(fieldtype, required=required)
 
     @converts(BooleanField)
     def convert_boolean_field(self, field):
@@ -53,7 +321,7 @@ class BaseConverter(object):
         vals = dict([(v.__class__, v) for v in field.validators])
         required = self._is_required(vals)
 
-        return fieldtype, {}, required
+        return FieldSpec(fieldtype, required=required)
 
     @converts(DateTimeField)
     def date_time_field(self, field):
@@ -64,7 +332,7 @@ class BaseConverter(object):
 
         required = self._is_required(vals)
 
-        return fieldtype, options, required
+        return FieldSpec(fieldtype, options, required)
 
     @converts(StringField)
     def string_field(self, field):
@@ -82,7 +350,7 @@ class BaseConverter(object):
         elif 'format' not in options.keys():
             options['maxLength'] = 255
 
-        return fieldtype, options, required
+        return FieldSpec(fieldtype, options, required)
 
     @converts(DecimalField)
     def decimal_field(self, field):
@@ -96,7 +364,7 @@ class BaseConverter(object):
             options['minimum'] = vals[NumberRange].min
             options['maximum'] = vals[NumberRange].max
 
-        return fieldtype, options, required
+        return FieldSpec(fieldtype, options, required)
 
     @converts(IntegerField)
     def integer_field(self, field):
@@ -110,8 +378,10 @@ class BaseConverter(object):
             options['minimum'] = vals[NumberRange].min
             options['maximum'] = vals[NumberRange].max
 
-        return fieldtype, options, required
+        return FieldSpec(fieldtype, options, required)
 
+    # Not dynamic: wtforms copies the choices when binding the field, so
+    # converting the same field again never shows new choices.
     @converts(SelectField)
     def select_field(self, field):
         choices = field.choices
@@ -126,56 +396,243 @@ class BaseConverter(object):
         vals = dict([(v.__class__, v) for v in field.validators])
         required = self._is_required(vals)
 
-        return fieldtype, options, required
+        return FieldSpec(fieldtype, options, required)
 
-    def convert_field(self, field):
+    @converts(FieldList)
+    def field_list(self, field):
         """
-        Convert a field to its json schema version.
+        Convert a FieldList to an array. The items schema is converted once
+        from the unbound field that the FieldList uses as a template for its
+        entries, so the entries themselves are never converted.
+        """
+        fieldtype = 'array'
+        template = field.unbound_field.bind(
+            form=None, name=field.short_name, prefix=field._prefix,
+            _meta=field.meta, translations=field._translations)
+        with self._conversion() as outermost:
+            items, req = self._convert_property(template)
+            if outermost and self._definitions:
+                # Converted on its own, without a schema to add the
+                # definitions of subforms to.
+                items = _inline_refs(items, self._definitions)
+        options = {'items': items}
+        if field.min_entries > 0:
+            options['minItems'] = field.min_entries
+        if field.max_entries is not None:
+            options['maxItems'] = field.max_entries
+        vals = dict([(v.__class__, v) for v in field.validators])
+        required = self._is_required(vals)
+
+        return FieldSpec(fieldtype, options, required)
+
+    def field_spec(self, field):
+        """
+        Convert a field to a FieldSpec with its JSONSchema type, options and
+        whether it is required.
         """
         cls = field.__class__
-        if cls not in self.converters.keys():
+        converter = self._find_converter(cls)
+        if converter is None:
             raise UnsupportedFieldException(cls)
-        d = {}
-        log.debug('Using converter %s' % self.converters[cls])
-        fieldtype, attrs, req = self.converters[cls](field)
-        log.debug('fieldtype, attrs, req: %s, %s, %s' % (fieldtype, attrs,
-                                                         req))
-        if fieldtype is not None:
-            d['type'] = fieldtype
-        for k, v in attrs.items():
-            d[k] = v
-        d['title'] = field.label.text
-        if field.description != '':
-            d['description'] = field.description
-        return d, req
+        log.debug('Using converter %s', converter)
+        spec = FieldSpec.from_result(converter(field))
+        log.debug('Converted to %r', spec)
+        if self.tracers:
+            self._event('spec', field.name, spec)
+        return spec
+
+    def convert_field(self, field, definitions=None):
+        """
+        Convert a field to its json schema version.
+
+        With subform_refs, the subforms of the field (like those of a
+        FieldList of FormFields) are referred to with a $ref. Outside of a
+        conversion of the form, their definitions are added to definitions,
+        the definitions of the schema the property is added to, or they are
+        inlined if definitions isn't passed.
+        """
+        if self._subforms is not None:
+            return self._convert_field(field)
+        with self._conversion():
+            d, required = self._convert_field(field)
+            if self._definitions:
+                if definitions is None:
+                    d = _inline_refs(d, self._definitions)
+                else:
+                    definitions.update(self._definitions)
+        return d, required
+
+    def _convert_field(self, field):
+        spec = self.field_spec(field)
+        d = spec.to_schema()
+        if self.titles:
+            d['title'] = field.label.text
+            if field.description != '':
+                d['description'] = field.description
+        if self._dynamic is not None and getattr(
+                self.converters.get(field.__class__), '_dynamic', False):
+            self._dynamic.append((d, field))
+        return d, spec.required
+
+    def _convert_subform(self, field):
+        """
+        Convert the subform of a FormField. Every form class is only
+        converted once during a conversion, and every FormField using it
+        gets a copy.
+        """
+        form_class = field.form_class
+        if self.tracers:
+            self._event('cache_hit' if form_class in self._subforms
+                        else 'cache_miss', 'subforms', form_class)
+        if form_class not in self._subforms:
+            log.debug("Subform: %s", form_class)
+            dynamic = self._dynamic
+            start = len(dynamic) if dynamic is not None else 0
+            # Use the form bound to the field if there is one, to save
+            # instantiating the form class again. FormField delegates
+            # unknown attributes to that form, so don't use getattr.
+            subform = self._convert_form(field.__dict__.get('form',
+                                                            form_class))
+            log.debug("Converted: %s", subform)
+            name = form_class.__name__
+            while name in self._definitions:
+                name = '_' + name
+            # The dynamic properties recorded for the subform
+            recorded = dynamic[start:] if dynamic is not None else []
+            self._subforms[form_class] = (name, subform, recorded)
+            if self.subform_refs:
+                self._definitions[name] = subform
+        name, subform, recorded = self._subforms[form_class]
+        if self.subform_refs:
+            schema = self._dict([('$ref', '#/definitions/%s' % name)])
+        else:
+            # Every use gets a copy, so it can be changed by itself. The
+            # dynamic properties of the copy are recorded as well.
+            copies = {} if recorded else None
+            schema = _copy_tree(subform, copies)
+            for node, dyn_field in recorded:
+                if id(node) in copies:
+                    self._dynamic.append((copies[id(node)], dyn_field))
+        if self.titles:
+            schema['title'] = field.label.text
+        return schema
+
+    def _convert_property(self, field):
+        """
+        Convert a field of a form to a property, turning FormFields into
+        (sub)schemas of their own.
+        """
+        if field.__class__ == FormField:
+            return self._convert_subform(field), False
+        return self.convert_field(field)
+
+    def _convert_shared_property(self, form, key, field):
+        """
+        Convert a field of a form to a property, reusing the conversion of
+        the same field of another form while converting several forms.
+        """
+        shared = self._shared
+        unbound = getattr(form.__class__, key, None)
+        if shared is None or not isinstance(unbound, UnboundField) or \
+                field.__class__ == FormField or self._dynamic is not None:
+            # Subforms are already converted once per conversion, and
+            # recorded dynamic properties can't be shared.
+            return self._convert_property(field)
+        cache_key = self._shared_key(form, key, unbound)
+        result = shared.fields.get(cache_key)
+        if self.tracers:
+            self._event('cache_miss' if result is None else 'cache_hit',
+                        'fields', field)
+        if result is None:
+            result = shared.fields[cache_key] = self._convert_property(field)
+            return result
+        # The forms get a copy, so they can be changed independently.
+        return _copy_tree(result[0]), result[1]
+
+    def _shared_key(self, form, key, unbound):
+        """
+        The key under which the conversion of the field key of a form is
+        shared with other forms, see SharedFields.
+        """
+        return (self._shared.scope, key, describe(unbound))
+
+    @contextmanager
+    def _sharing_fields(self):
+        """
+        Share the conversions of fields between the conversions made in
+        this context, see SharedFields.
+        """
+        if self._shared is not None:
+            yield self._shared
+            return
+        self._shared = SharedFields()
+        try:
+            yield self._shared
+        finally:
+            self._shared = None
+
+    def dumps(self, schema):
+        """
+        Serialize a schema to a JSON string. In compact mode all whitespace
+        is left out.
+        """
+        separators = (',', ':') if self.compact else None
+        return json.dumps(schema, separators=separators,
+                          default=_json_default)
 
     def convert(self, form):
         """
         Convert a Form to JSON Schema.
         """
-        log.info("Converting form %s to JSON Schema" % form)
-        if isinstance(form, FormMeta):
-            form = form()
-        fields = OrderedDict([(f.name, f) for f in form
-                              if f.name not in self.skip_fields])
-        schema = OrderedDict([
+        name = getattr(form, '__name__', form.__class__.__name__)
+        with self._conversion() as outermost, \
+                self._span('convert', name, form):
+            schema = self._convert_form(form)
+            if outermost:
+                self._finish(schema)
+        return schema
+
+    def convert_fields(self, form, fields):
+        """
+        Convert only the named fields of a Form to JSON Schema. The other
+        fields are left out of the schema and aren't converted at all.
+        """
+        name = getattr(form, '__name__', form.__class__.__name__)
+        with self._conversion() as outermost, \
+                self._span('convert', name, form):
+            schema = self._convert_form(form, fields)
+            if outermost:
+                self._finish(schema)
+        return schema
+
+    def _convert_form(self, form, fields=None):
+        log.info("Converting form %s to JSON Schema", form)
+        name = getattr(form, '__name__', form.__class__.__name__)
+        with self._span('form', name, form):
+            if isinstance(form, FormMeta):
+                with self._span('form_init', name, form):
+                    form = form()
+            return self._convert_form_fields(form, fields)
+
+    def _convert_form_fields(self, form, only=None):
+        # Fields of bound subforms have their names prefixed with the name of
+        # the FormField, so use the short name.
+        fields = OrderedDict([(f.short_name, f) for f in form
+                              if f.short_name not in self.skip_fields
+                              and (only is None or f.short_name in only)])
+        schema = self._dict([
             ("type", "object"),
-            ("properties", OrderedDict())
+            ("properties", self._dict())
         ])
         required = []
 
         for key, field in fields.items():
             cls = field.__class__
-            log.debug('Converting field %s of type %s' % (key, cls))
-            log.debug('Supported fields: {}'.format(self.converters.keys()))
-            if cls == FormField:
-                log.debug("Subform: {}".format(field.form_class))
-                subform = self.convert(field.form_class)
-                log.debug("Converted: {}".format(subform))
-                schema['properties'][key] = subform
-                subform['title'] = field.label.text
-                continue
-            field_schema, req = self.convert_field(field)
+            log.debug('Converting field %s of type %s', key, cls)
+            log.debug('Supported fields: %s', self.converters.keys())
+            with self._span('field', key, field):
+                field_schema, req = self._convert_shared_property(form, key,
+                                                                  field)
             schema['properties'][key] = field_schema
             if req:
                 required.append(key)
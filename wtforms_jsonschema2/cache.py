@@ -0,0 +1,317 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from .fingerprint import fingerprint
+from .refresh import _node_ids
+from .utils import _json_default
+
+log = logging.getLogger(__name__)
+
+
+def _cache_key(views, kwargs):
+    if isinstance(views, list):
+        views = tuple(views)
+    return (views, tuple(sorted(kwargs.items())))
+
+
+def _weak_key(key, callback=None):
+    """Replace the classes in a (nested) tuple key by weak references."""
+    if isinstance(key, type):
+        return weakref.ref(key, callback)
+    if isinstance(key, tuple):
+        return tuple(_weak_key(part, callback) for part in key)
+    return key
+
+
+def _has_ref(key, ref):
+    if key is ref:
+        return True
+    return isinstance(key, tuple) and any(_has_ref(k, ref) for k in key)
+
+
+class WeakLRUCache(object):
+    """
+    A mapping holding at most maxsize items, dropping the least recently
+    used item when it is full. Classes in its keys (which can be tuples)
+    are referred to weakly: once a class is garbage collected, the items
+    with that class in their key are dropped, so caches don't keep
+    dynamically created form and view classes alive.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        # The callback of the weak references can run at any moment the
+        # garbage collector runs, including while the lock is held.
+        self._lock = threading.RLock()
+
+    def _remove(self, ref):
+        with self._lock:
+            for key in [k for k in self._data if _has_ref(k, ref)]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return _weak_key(key) in self._data
+
+    def get(self, key, default=None):
+        key = _weak_key(key)
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def __getitem__(self, key):
+        value = self.get(key, _missing)
+        if value is _missing:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        weak_key = _weak_key(key)
+        with self._lock:
+            if weak_key in self._data:
+                self._data.move_to_end(weak_key)
+                self._data[weak_key] = value
+                return
+            self._data[_weak_key(key, self._remove)] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def setdefault(self, key, value):
+        with self._lock:
+            existing = self.get(key, _missing)
+            if existing is not _missing:
+                return existing
+            self[key] = value
+            return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(_weak_key(key), default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_missing = object()
+
+
+class _Flight(object):
+    """A conversion in progress, which other threads can wait for."""
+    __slots__ = ('generation', 'done', 'result', 'error')
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SchemaCache(object):
+    """
+    Caches the schemas of a converter per views (or form) and the keyword
+    arguments of convert(), like the form_type of a FABConverter.
+
+    The cache can be shared between threads. Different schemas are
+    converted in parallel, but each schema is converted only once at a
+    time: threads asking for a schema that is being converted wait for
+    that conversion instead of starting their own.
+
+    If a backend like a DiskCache is passed, schemas that aren't in memory
+    are looked up there by the fingerprint of the conversion (see
+    wtforms_jsonschema2.fingerprint) before converting them, and converted
+    schemas are stored there. Schemas with properties of dynamic converters
+    (see wtforms_jsonschema2.base.dynamic), like the enums of
+    QuerySelectFields, aren't stored: their choices come from the database
+    and aren't part of the fingerprint.
+
+    At most maxsize schemas are kept in memory, and schemas of form or view
+    classes that are garbage collected are dropped.
+
+    The cached schemas are shared between callers, don't modify them.
+    """
+
+    def __init__(self, converter, backend=None, maxsize=128):
+        self.converter = converter
+        self.backend = backend
+        self._schemas = WeakLRUCache(maxsize)
+        # The conversions in progress, per key
+        self._flights = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._schemas)
+
+    def cached(self, views, **kwargs):
+        """Whether the schema of views is cached."""
+        return _cache_key(views, kwargs) in self._schemas
+
+    def get(self, views, **kwargs):
+        """Return the schema of views, converting them if not cached."""
+        key = _cache_key(views, kwargs)
+        schema = self._schemas.get(key)
+        if schema is not None:
+            return schema
+        with self._lock:
+            schema = self._schemas.get(key)
+            if schema is not None:
+                return schema
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight(self._generation)
+        if not leader:
+            return flight.wait()
+        try:
+            flight.result = self._load(views, kwargs)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                # Don't cache a schema that was invalidated while converting
+                if flight.error is None and \
+                        flight.generation == self._generation:
+                    self._schemas[key] = flight.result
+            flight.done.set()
+        return flight.result
+
+    def _load(self, views, kwargs):
+        if self.backend is None:
+            log.debug('Converting %s', views)
+            return self.converter.convert(views, **kwargs)
+        key = fingerprint(self.converter, views, **kwargs)
+        schema = self.backend.get(key, self.converter._dict)
+        if schema is not None:
+            return schema
+        log.debug('Converting %s', views)
+        converter = self.converter
+        dynamic, converter._dynamic = converter._dynamic, []
+        try:
+            schema = converter.convert(views, **kwargs)
+            recorded = converter._dynamic
+        finally:
+            converter._dynamic = dynamic
+        ids = _node_ids(schema, set())
+        if any(id(node) in ids for node, field in recorded):
+            log.debug('Not storing %s, it has dynamic properties', views)
+        else:
+            self.backend.set(key, schema)
+        return schema
+
+    def invalidate(self, views, **kwargs):
+        """Forget the schema of views."""
+        with self._lock:
+            self._generation += 1
+            self._schemas.pop(_cache_key(views, kwargs), None)
+
+    def clear(self):
+        """Forget all schemas, for instance after the views changed."""
+        with self._lock:
+            self._generation += 1
+            self._schemas.clear()
+
+
+class DiskCache(object):
+    """
+    Stores schemas as JSON files in a directory, so they survive restarts.
+    The directory can be shared between processes: files are written
+    atomically, so readers never see a partly written file.
+
+    When the files take more than max_size bytes, the least recently used
+    ones are removed. Schemas are dumped like BaseConverter.dumps() does,
+    so lazy strings are stored in the locale of the conversion.
+    """
+    SUFFIX = '.json'
+
+    def __init__(self, directory, max_size=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, key, dict_class=dict):
+        """Return the schema stored under key, or None."""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            schema = json.loads(data, object_pairs_hook=dict_class)
+            # Mark the file as recently used
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        log.debug('Loaded %s', path)
+        return schema
+
+    def set(self, key, schema):
+        """Store schema under key."""
+        data = json.dumps(schema, separators=(',', ':'),
+                          default=_json_default).encode('utf-8')
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        log.debug('Stored %s', self.path(key))
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    @property
+    def size(self):
+        """The number of bytes taken by the stored schemas."""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Remove the least recently used files over max_size."""
+        entries = sorted(self._entries())
+        size = sum(size for _, size, _ in entries)
+        while size > self.max_size and entries:
+            mtime, file_size, path = entries.pop(0)
+            log.debug('Evicting %s', path)
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            size -= file_size
+
+    def clear(self):
+        """Remove all stored schemas."""
+        for _, _, path in self._entries():
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
@@ -1,5 +1,3 @@
-from collections import OrderedDict
-from .utils import _get_related_view_property
 from flask_appbuilder.views import BaseView
 import inspect
 import logging
@@ -43,8 +41,8 @@ class oneOf(ViewCondition):
         """Return the JSON Schema version of this condition."""
         schema = []
         for rel_view, condition in self.conditions.items():
-            schema_cond = OrderedDict([('properties', OrderedDict()),
-                                       ('required', [])])
+            schema_cond = converter._dict([('properties', converter._dict()),
+                                           ('required', [])])
             for fieldname, val in condition.items():
                 form = converter._get_form(view, 'add')()
                 field, req = converter.convert_field(getattr(form, fieldname))
@@ -54,21 +52,22 @@ class oneOf(ViewCondition):
                     # convert val to the same format as the enum field
                     newvals = []
                     for v in val:
-                        log.debug('val: {}'.format(v))
-                        log.debug('enum: {}'.format(field['enum']))
+                        log.debug('val: %s', v)
+                        log.debug('enum: %s', field['enum'])
                         for c in field['enum']:
                             if isinstance(c, dict) and (c['id'] == v or
                                                         c['label'] == v):
                                 newvals.append(c)
                             elif c == v:
                                 newvals.append(c)
-                    log.debug('newvals: {}'.format(newvals))
+                    log.debug('newvals: %s', newvals)
                     val = newvals
                 schema_cond['properties'][fieldname] = {'enum': val}
                 schema_cond['required'].append(fieldname)
 
             for field in rel_view.datamodel.get_related_fks([view]):
-                defin = _get_related_view_property(view, rel_view, field)
+                defin = converter._related_view_property(view, rel_view,
+                                                         field)
                 schema_cond['properties'][field] = defin
                 schema_cond['required'].append(field)
             schema.append(schema_cond)
@@ -0,0 +1,146 @@
+from collections import OrderedDict
+import logging
+from .utils import _canonical_json, _schema_digest, _copy_tree
+
+log = logging.getLogger(__name__)
+
+# Keys that only describe a subtree to humans. They are ignored when
+# comparing subtrees and kept on the $ref that replaces them.
+ANNOTATION_KEYS = ('title', 'description')
+
+
+def _is_object_schema(node):
+    return isinstance(node, dict) and node.get('type') == 'object' and \
+        'properties' in node
+
+
+def _strip_annotations(node):
+    return node.__class__([(k, v) for k, v in node.items()
+                           if k not in ANNOTATION_KEYS])
+
+
+def _camelcase(name):
+    return ''.join(part[:1].upper() + part[1:]
+                   for part in str(name).replace('-', '_').split('_'))
+
+
+def _iter_candidates(node, hint=None, is_definition=False):
+    """
+    Walk a schema and yield (kind, key, node, hint) for every subtree that
+    can be hoisted into the definitions. kind is either 'object' for
+    subforms and point objects or 'enum' for enum arrays.
+    """
+    if isinstance(node, list):
+        for item in node:
+            yield from _iter_candidates(item, hint)
+        return
+    if not isinstance(node, dict):
+        return
+    if _is_object_schema(node) and not is_definition:
+        yield ('object', _schema_digest(_strip_annotations(node)), node, hint)
+    if isinstance(node.get('enum'), list):
+        # The type is part of the definition, since validators ignore the
+        # keys next to a $ref
+        yield ('enum', _schema_digest(_strip_annotations(node)), node, hint)
+    for k, v in node.items():
+        if k == 'definitions' and isinstance(v, dict):
+            for name, defin in v.items():
+                yield from _iter_candidates(defin, name, is_definition=True)
+        elif k == 'properties' and isinstance(v, dict):
+            for name, prop in v.items():
+                yield from _iter_candidates(prop, name)
+        elif k != 'enum':
+            yield from _iter_candidates(v, hint)
+
+
+def find_duplicates(schema, min_size=64):
+    """
+    Find structurally equal subtrees in schema.
+
+    Returns a dict mapping the digest of each duplicated subtree to a tuple
+    (kind, nodes, hint, size), where nodes lists every occurrence in document
+    order, hint is the property name of the first occurrence and size is the
+    length of the canonical serialization of one occurrence. Subtrees smaller
+    than min_size bytes are ignored.
+    """
+    found = OrderedDict()
+    for kind, key, node, hint in _iter_candidates(schema):
+        found.setdefault((kind, key), (kind, [], hint))[1].append(node)
+    duplicates = OrderedDict()
+    for (kind, key), (kind, nodes, hint) in found.items():
+        if len(nodes) < 2:
+            continue
+        size = len(_canonical_json(_strip_annotations(nodes[0])))
+        if size < min_size:
+            continue
+        duplicates[key] = (kind, nodes, hint, size)
+    return duplicates
+
+
+def _definition_name(kind, key, hint, taken):
+    name = _camelcase(hint or kind)
+    if kind == 'enum':
+        name += 'Enum'
+    if name in taken:
+        name = '{}_{}'.format(name, key[:8])
+    return name
+
+
+def deduplicate(schema, min_size=64):
+    """
+    Hoist duplicated subtrees of a schema into its definitions.
+
+    Subforms (including GeoFAB point objects) and enum arrays are hashed
+    structurally. Every subtree that occurs more than once is emitted once
+    under definitions and all occurrences are replaced by a $ref.
+    Titles and descriptions are not part of the comparison and are kept next
+    to the $ref. Everything else, like the type of an enum, moves into the
+    definition, since JSON Schema validators ignore the other keys next to a
+    $ref.
+
+    The passed schema is not modified, a deduplicated copy is returned.
+    """
+    schema = _copy_tree(schema)
+    if 'definitions' not in schema:
+        schema['definitions'] = schema.__class__()
+    definitions = schema['definitions']
+    # Copies of a hoisted subtree disappear from the document, and so do the
+    # duplicates nested inside them. Larger subtrees are hoisted first, so
+    # nested duplicates are only hoisted if they still occur more than once.
+    duplicates = sorted(find_duplicates(schema, min_size).items(),
+                        key=lambda item: -item[1][3])
+    removed = set()
+    for key, (kind, nodes, hint, size) in duplicates:
+        nodes = [n for n in nodes if id(n) not in removed]
+        if len(nodes) < 2:
+            continue
+        name = _definition_name(kind, key, hint, definitions)
+        ref = '#/definitions/%s' % name
+        log.debug('Hoisting %s %s used %d times', kind, name, len(nodes))
+        definitions[name] = _strip_annotations(nodes[0])
+        for node in nodes[1:]:
+            removed.update(_descendant_ids(node))
+        for node in nodes:
+            _replace_with_ref(node, ref)
+    if len(definitions) == 0:
+        del schema['definitions']
+    return schema
+
+
+def _descendant_ids(node):
+    if isinstance(node, dict):
+        node = list(node.values())
+    if isinstance(node, list):
+        for item in node:
+            if isinstance(item, (dict, list)):
+                yield id(item)
+                yield from _descendant_ids(item)
+
+
+def _replace_with_ref(node, ref):
+    items = list(node.items())
+    node.clear()
+    node['$ref'] = ref
+    for k, v in items:
+        if k in ANNOTATION_KEYS:
+            node[k] = v
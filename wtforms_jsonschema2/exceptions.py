@@ -4,3 +4,40 @@ class UnsupportedFieldException(Exception):
     """
     def __init__(self, field_class):
         self.message = "Field %s is not supported." % field_class
+
+
+class UnsupportedSchemaException(Exception):
+    """
+    Raised when an attempt is made to build a field from a part of a schema
+    that we don't understand.
+    """
+    def __init__(self, schema):
+        self.message = "Schema %s is not supported." % (schema,)
+        super().__init__(self.message)
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    Raised when a conversion issues more database queries than allowed.
+    """
+    def __init__(self, queries, budget):
+        self.queries = queries
+        self.budget = budget
+        self.message = "Conversion issued %d queries, the budget is %d." % (
+            queries, budget)
+        super().__init__(self.message)
+
+
+class SchemaBudgetExceeded(Exception):
+    """
+    Raised when a schema, or a definition in it, is larger than allowed.
+    exceeded lists the (name, size, budget) of the parts over budget, with
+    name None for the whole schema.
+    """
+    def __init__(self, exceeded):
+        self.exceeded = exceeded
+        self.message = "Schema is over its size budget: %s" % ', '.join(
+            '%s is %d bytes, the budget is %d' % (name or 'schema', size,
+                                                  budget)
+            for name, size, budget in exceeded)
+        super().__init__(self.message)
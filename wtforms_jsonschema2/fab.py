@@ -1,11 +1,12 @@
-from flask_appbuilder.fields import (QuerySelectField,
-                                     QuerySelectMultipleField, EnumField)
-from flask_appbuilder.upload import ImageUploadField
-from collections import OrderedDict
+from contextlib import contextmanager
 import logging
-from .base import BaseConverter, converts
+import weakref
+from .base import (BaseConverter, FieldSpec, converts, dynamic,
+                   _conversion_state)
+from .fingerprint import describe
 from .utils import (_get_pretty_name, _get_related_view_property,
-                    _is_parent_related_view_property, _get_view_name)
+                    _is_parent_related_view_property, _get_view_name,
+                    _text)
 from wtforms.form import Form
 
 
@@ -16,20 +17,132 @@ class FABConverter(BaseConverter):
     """
     The FABConverter extends BaseConverter with functioality for
     flask appbuilder.
+
+    choice_labels declares the labels of the choices of query fields, as a
+    dict mapping a relation (like Person.person_type) or a related model
+    (like PersonType) to the name of a column of the related model, or to
+    an SQL expression (like PersonType.name). The choices of those fields
+    are loaded as (primary key, label) rows, instead of loading the related
+    objects and calling str() on each of them, and are loaded once per
+    conversion for every related model, label and filter.
     """
+    # The view and form type of the definition being converted.
+    _form_view = _conversion_state('form_view')
+    # Choices loaded during the conversion, see _projected_choices().
+    _choices = _conversion_state('choices')
+
+    def __init__(self, *args, choice_labels=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.choice_labels = choice_labels or {}
+        # The view and form type of recorded dynamic fields with declared
+        # labels, so they are refreshed with the same projection query.
+        self._field_views = weakref.WeakKeyDictionary()
+
+    @contextmanager
+    def _conversion(self):
+        with super()._conversion() as outermost:
+            if not outermost:
+                yield False
+                return
+            self._choices = {}
+            try:
+                yield True
+            finally:
+                self._choices = None
+                self._form_view = None
+
+    def _choice_label(self, datamodel, related, name):
+        """
+        The label column or expression declared for the choices of the
+        relation name, or None.
+        """
+        if not self.choice_labels:
+            return None
+        label = None
+        attr = getattr(datamodel.obj, name, None)
+        if attr is not None:
+            label = self.choice_labels.get(attr)
+        if label is None:
+            label = self.choice_labels.get(related.obj)
+        if isinstance(label, str):
+            label = getattr(related.obj, label)
+        return label
 
-    @converts(EnumField)
+    def _projected_choices(self, field):
+        """
+        Load the (primary key, label) choices of a query field with a
+        projection query if its label is declared in choice_labels, or
+        return None. No objects of the related model are loaded.
+        """
+        if not self.choice_labels:
+            return None
+        form_view = self._form_view or self._field_views.get(field)
+        if form_view is None:
+            return None
+        view, form_type = form_view
+        datamodel = view.datamodel
+        if not hasattr(datamodel, 'get_related_interface') or \
+                not datamodel.is_relation(field.name):
+            return None
+        related = datamodel.get_related_interface(field.name)
+        label = self._choice_label(datamodel, related, field.name)
+        if label is None or related.is_pk_composite():
+            return None
+        rel_fields = getattr(view, '%s_form_query_rel_fields' % form_type,
+                             None) or {}
+        filter_list = rel_fields.get(field.name)
+        if self._dynamic is not None:
+            self._field_views[field] = form_view
+        key = (related.obj, str(label), describe(filter_list))
+        cache = self._choices if self._choices is not None else {}
+        choices = cache.get(key)
+        if self.tracers:
+            self._event('cache_miss' if choices is None else 'cache_hit',
+                        'choices', field)
+        if choices is None:
+            query = related.session.query(related.get_pk(), label)
+            if filter_list:
+                filters = related.get_filters().add_filter_list(filter_list)
+                query = related.apply_filters(query, filters)
+            choices = cache[key] = [
+                (str(pk), _text(text)) for pk, text in query]
+        return choices
+
+    def _shared_key(self, form, key, unbound):
+        # The query fields of the add and edit forms have the same unbound
+        # fields, but the form types can filter their choices differently.
+        shared_key = super()._shared_key(form, key, unbound)
+        if self._form_view is None:
+            return shared_key
+        view, form_type = self._form_view
+        rel_fields = getattr(view, '%s_form_query_rel_fields' % form_type,
+                             None) or {}
+        return shared_key + (describe(rel_fields.get(key)),)
+
+    def _choices_enum(self, field, labels=_text):
+        """The enum of the choices of a query field."""
+        with self._span('choices', field.name, field):
+            choices = self._projected_choices(field)
+            if choices is None:
+                choices = [(c[0], labels(c[1])) for c in field.iter_choices()
+                           if c[0] != '__None']
+        return [{'id': c[0], 'label': c[1]} for c in choices]
+
+    @converts('flask_appbuilder.fields.EnumField')
+    @dynamic
     def convert_enum_field(self, field):
         fieldtype = 'object'
-        options = {'enum': [{'id': c[0], 'label': str(c[1])}
-                            for c in field.iter_choices()]}
+        with self._span('choices', field.name, field):
+            choices = list(field.iter_choices())
+        options = {'enum': [{'id': c[0], 'label': _text(c[1])}
+                            for c in choices]}
         required = False
         vals = dict([(v.__class__, v) for v in field.validators])
         required = self._is_required(vals)
 
-        return fieldtype, options, required
+        return FieldSpec(fieldtype, options, required)
 
-    @converts(ImageUploadField)
+    @converts('flask_appbuilder.upload.ImageUploadField')
     def convert_image_field(self, field):
         fieldtype = 'string'
         options = {'contentEncoding': 'base64',
@@ -37,87 +150,211 @@ class FABConverter(BaseConverter):
         vals = dict([(v.__class__, v) for v in field.validators])
         required = self._is_required(vals)
 
-        return fieldtype, options, required
+        return FieldSpec(fieldtype, options, required)
 
-    @converts(QuerySelectField)
+    @converts('flask_appbuilder.fields.QuerySelectField')
+    @dynamic
     def query_select_field(self, field):
-        choices = [c for c in field.iter_choices() if c[0] != '__None']
         fieldtype = 'object'
-        options = {'enum': [{'id': c[0], 'label': str(c[1])} for c in choices]}
+        options = {'enum': self._choices_enum(field)}
         required = False
         vals = dict([(v.__class__, v) for v in field.validators])
         required = self._is_required(vals)
 
-        return fieldtype, options, required
+        return FieldSpec(fieldtype, options, required)
 
-    @converts(QuerySelectMultipleField)
+    @converts('flask_appbuilder.fields.QuerySelectMultipleField')
+    @dynamic
     def query_select_multiple_field(self, field):
         fieldtype = 'array'
-        choices = [c for c in field.iter_choices() if c[0] != '__None']
-
         options = {'items': [{
             'type': 'object',
-            'enum': [{'id': c[0], 'label': c[1]} for c in choices]
+            'enum': self._choices_enum(field, labels=lambda label: label)
         }]}
         required = False
         vals = dict([(v.__class__, v) for v in field.validators])
         required = self._is_required(vals)
 
-        return fieldtype, options, required
+        return FieldSpec(fieldtype, options, required)
 
-    def _get_form(self, view, form_type):
+    def _related_view_property(self, view, related_view, field):
+        defin = _get_related_view_property(view, related_view, field)
+        if not self.titles:
+            defin.pop('title', None)
+        return defin
+
+    def _get_view(self, view):
         if isinstance(view, type):
+            shared = self._shared
+            if shared is not None and view in shared.views:
+                return shared.views[view]
+            cls = view
             # Instantiate the view if not done already
-            view = view()
+            with self._span('view_init', view.__name__, view):
+                view = view()
+            if shared is not None:
+                shared.views[cls] = view
+        return view
+
+    def _get_form(self, view, form_type):
+        view = self._get_view(view)
         if form_type == 'add':
             return view.add_form
         if form_type == 'edit':
             return view.edit_form
 
     def convert_view(self, view, form_type='add', parentView=None):
-        schema = OrderedDict([
+        with self._conversion() as outermost:
+            name, schema = self._convert_view(view, form_type, parentView)
+            if outermost:
+                self._finish(schema)
+        return name, schema
+
+    def _convert_view(self, view, form_type='add', parentView=None):
+        # Instantiate the view once, instead of for every lookup
+        view = self._get_view(view)
+        with self._span('view', _get_view_name(view), view):
+            return self._convert_view_definitions(view, form_type,
+                                                  parentView)
+
+    def _convert_view_definitions(self, view, form_type, parentView):
+        schema = self._dict([
             ('type', 'object'),
-            ('definitions', OrderedDict([])),
-            ('properties', OrderedDict([]))
+            ('definitions', self._dict()),
+            ('properties', self._dict())
         ])
+        name, view_definition = self._convert_view_definition(
+            view, form_type, parentView)
+        schema['definitions'][name] = view_definition
+        schema['properties'][name] = {'$ref': '#/definitions/%s' % name}
+        if view.related_views is not None:
+            for v in view.related_views:
+                rel_name, rel_schema = self._convert_view(v, form_type,
+                                                          parentView=view)
+                for defin_k, defin in rel_schema['definitions'].items():
+                    schema['definitions'][defin_k] = defin
+        return name, schema
+
+    def _convert_view_definition(self, view, form_type, parentView,
+                                 fields=None):
+        """
+        Convert a view to its own definition, without the definitions of
+        its related views. If fields is passed, only those properties are
+        converted, and the conditions of the view are left out.
+        """
         # name = _get_pretty_name(view, 'show').replace(' ', '')
         name = _get_view_name(view)
-        view_definition = super().convert(
-            self._get_form(view,  form_type))
-        schema['definitions'][name] = view_definition
+        if self._shared is not None:
+            # Fields are only the same as those of other forms of the view
+            self._shared.scope = view.__class__
+        self._form_view = (view, form_type)
+        conditions = []
+        if fields is None:
+            conditions = getattr(view, '_conditional_relations', [])
+        related = self._related_view_fields(view)
+        form_fields = fields
+        if fields is not None:
+            # Relations to related views are replaced anyway
+            form_fields = [f for f in fields if f not in related]
+        view_definition = self._convert_form(self._get_form(view, form_type),
+                                             form_fields)
         if parentView is not None:
             # Remove references to ParientView
-            for propkey in view_definition['properties'].keys():
+            for propkey in list(view_definition['properties'].keys()):
                 if _is_parent_related_view_property(view, parentView, propkey):
-                    log.debug('removing {}'.format(propkey))
+                    log.debug('removing %s', propkey)
                     del view_definition['properties'][propkey]
-                    if propkey in view_definition['required']:
+                    if propkey in view_definition.get('required', []):
                         view_definition['required'].remove(propkey)
                 else:
-                    log.debug('Keeping {}'.format(propkey))
-        view_definition['title'] = _get_pretty_name(view, 'show')
-        schema['properties'][name] = {'$ref': '#/definitions/%s' % name}
-        conditions = []
-        if hasattr(view, '_conditional_relations'):
-            conditions = view._conditional_relations
-            for condition in conditions:
+                    log.debug('Keeping %s', propkey)
+        if self.titles:
+            view_definition['title'] = _get_pretty_name(view, 'show')
+        for condition in conditions:
+            with self._span('condition', condition.__class__.__name__,
+                            condition):
                 ckey, cval = condition.get_json_schema(view, self)
-                schema['definitions'][name][ckey] = cval
-        conditional_views = [cv for cond in conditions
+            view_definition[ckey] = cval
+        for f, v in related.items():
+            if fields is None or f in fields:
+                defin = self._related_view_property(view, v, f)
+                view_definition['properties'][f] = defin
+        return name, view_definition
+
+    def _related_view_fields(self, view):
+        """
+        The relation fields of a view that refer to a related view which
+        isn't conditional, with that related view.
+        """
+        conditional_views = [cv for cond in
+                             getattr(view, '_conditional_relations', [])
                              for cv in cond.affected_views]
-        if view.related_views is not None:
-            for v in view.related_views:
-                rel_name, rel_schema = self.convert_view(v, form_type,
-                                                         parentView=view)
-                for defin_k, defin in rel_schema['definitions'].items():
-                    schema['definitions'][defin_k] = defin
-                if v in conditional_views:
-                    # Related view is conditional so don't add to properties
-                    continue
-                for f in v.datamodel.get_related_fks([view]):
-                    defin = _get_related_view_property(view, v, f)
-                    schema['definitions'][name]['properties'][f] = defin
-        return name, schema
+        related = self._dict()
+        for v in view.related_views or []:
+            if v in conditional_views:
+                # Related view is conditional so don't add to properties
+                continue
+            for f in v.datamodel.get_related_fks([view]):
+                related[f] = v
+        return related
+
+    def convert_fields(self, view, fields, form_type='add'):
+        """
+        Convert only the named fields of a view (or Form) to JSON Schema,
+        returning the partial definition of the view. Relations to related
+        views become references, but the related views aren't converted.
+        """
+        if isinstance(view, Form) or \
+                (isinstance(view, type) and issubclass(view, Form)):
+            return super().convert_fields(view, fields)
+        with self._conversion() as outermost:
+            view = self._get_view(view)
+            name = _get_view_name(view)
+            with self._span('convert', name, view), \
+                    self._span('view', name, view):
+                _, schema = self._convert_view_definition(view, form_type,
+                                                          None, fields)
+            if outermost:
+                self._finish(schema)
+        return schema
+
+    def convert_pointer(self, views, pointer, form_type='add'):
+        """
+        Return the part of the schema of the views at a JSON pointer, like
+        '/definitions/Contact/properties/country', converting only what is
+        needed for it. See LazySchema.resolve().
+        """
+        return self.convert_lazy(views, form_type).resolve(pointer)
+
+    def convert_lazy(self, views, form_type='add'):
+        """
+        Return a LazySchema of the views (see wtforms_jsonschema2.lazy),
+        in which the definitions are only converted when accessed.
+        """
+        from .lazy import LazySchema
+        return LazySchema(self, views, form_type)
+
+    def convert_sharded(self, views, form_type='add', ref_format='{}.json'):
+        """
+        Return a ShardedSchema of the views (see wtforms_jsonschema2.shards),
+        with a separate document per definition.
+        """
+        from .shards import ShardedSchema
+        return ShardedSchema(self, views, form_type, ref_format)
+
+    def convert_forms(self, views, form_types=('add', 'edit')):
+        """
+        Convert the views for several form types at once, returning a dict
+        with the schema per form type. The views are instantiated once, and
+        fields that are the same in the forms of a view (like most fields
+        of the add and edit forms) are converted once, including the
+        queries for their choices.
+        """
+        schemas = self._dict()
+        with self._sharing_fields(), self._span('convert', None, views):
+            for form_type in form_types:
+                schemas[form_type] = self.convert(views, form_type)
+        return schemas
 
     def convert(self, views, form_type='add'):
         """
@@ -147,15 +384,19 @@ class FABConverter(BaseConverter):
             iter(views)
         except TypeError:
             views = [views]
-        schema = OrderedDict([
+        schema = self._dict([
             ('type', 'object'),
-            ('definitions', OrderedDict([])),
-            ('properties', OrderedDict([]))
+            ('definitions', self._dict()),
+            ('properties', self._dict())
         ])
-        for view in views:
-            name, view_schema = self.convert_view(view, form_type)
-            for k, v in view_schema['definitions'].items():
-                schema['definitions'][k] = v
-            for k, v in view_schema['properties'].items():
-                schema['properties'][k] = v
+        with self._conversion() as outermost, \
+                self._span('convert', None, views):
+            for view in views:
+                name, view_schema = self._convert_view(view, form_type)
+                for k, v in view_schema['definitions'].items():
+                    schema['definitions'][k] = v
+                for k, v in view_schema['properties'].items():
+                    schema['properties'][k] = v
+            if outermost:
+                self._finish(schema)
         return schema
@@ -0,0 +1,189 @@
+"""
+Fingerprints of the inputs of a conversion, which change whenever the
+schema of a form or view could change because of a code change.
+
+The fingerprint of a form covers its class, and the class, arguments and
+validators of each of its fields. Functions are identified by their
+qualified name, a hash of their code, their default arguments and the
+contents of their closure, like the filters of the query of a Flask
+Appbuilder query field. Memory addresses are left out of the
+representations of other objects, and SQLAlchemy objects like sessions
+are only identified by their class, so fingerprints are stable across
+restarts.
+
+The fingerprint of a view covers its forms, titles, conditions, the
+filters of its query fields and its related views. Choices loaded from the
+database are not part of it.
+
+The fingerprint of a conversion also covers the converter class and its
+options, and the version of this library. Converters can set a
+cache_version attribute, which is part of the fingerprint as well, to
+invalidate cached schemas after changing how they convert fields.
+"""
+from decimal import Decimal
+import hashlib
+import re
+import threading
+import types
+from wtforms.form import FormMeta, BaseForm
+from wtforms.fields.core import UnboundField
+from .version import version
+
+_ADDRESS = re.compile(r' at 0x[0-9a-fA-F]+')
+# Deeper objects are only identified by their class.
+MAX_DEPTH = 8
+VIEW_TITLES = ('add_title', 'edit_title', 'show_title', 'list_title')
+
+
+def _path(obj):
+    return '{}.{}'.format(getattr(obj, '__module__', None),
+                          getattr(obj, '__qualname__',
+                                  getattr(obj, '__name__', None)))
+
+
+def _opaque(obj):
+    """
+    Whether obj is only identified by its class: the state of database
+    sessions, engines and mapped attributes has nothing to do with the code,
+    and thread locals differ per thread.
+    """
+    return obj.__class__.__module__.partition('.')[0] == 'sqlalchemy' or \
+        isinstance(obj, threading.local)
+
+
+def _code_hash(code):
+    """A hash of compiled code, including its constants and names."""
+    h = hashlib.sha256(code.co_code)
+    for const in code.co_consts:
+        h.update((_code_hash(const) if isinstance(const, types.CodeType)
+                  else describe(const)).encode('utf-8'))
+    h.update(' '.join(code.co_names).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def _describe_function(func, depth, seen):
+    if isinstance(func, types.MethodType):
+        func = func.__func__
+    code = getattr(func, '__code__', None)
+    if code is None or depth > MAX_DEPTH or id(func) in seen:
+        return _path(func)
+    seen.add(id(func))
+    cells = []
+    for cell in func.__closure__ or ():
+        try:
+            cells.append(cell.cell_contents)
+        except ValueError:
+            # A variable that isn't assigned yet
+            cells.append(None)
+    return '{}<{}>({},{},{})'.format(
+        _path(func), _code_hash(code),
+        describe(func.__defaults__, depth + 1, seen),
+        describe(func.__kwdefaults__, depth + 1, seen),
+        describe(cells, depth + 1, seen))
+
+
+def unbound_fields(form_class):
+    """
+    Return the (name, unbound field) of a form class in the order wtforms
+    binds them, without instantiating the form.
+    """
+    fields = []
+    for name in dir(form_class):
+        if name.startswith('_'):
+            continue
+        field = getattr(form_class, name)
+        if hasattr(field, '_formfield'):
+            fields.append((name, field))
+    fields.sort(key=lambda x: (x[1].creation_counter, x[0]))
+    return fields
+
+
+def describe(obj, depth=0, seen=None):
+    """
+    Return a string describing obj that only changes when obj changes, and
+    is the same in every process.
+    """
+    if seen is None:
+        seen = set()
+    if obj is None or isinstance(obj, (bool, int, float, str, bytes,
+                                       Decimal)):
+        return repr(obj)
+    if isinstance(obj, FormMeta):
+        return 'Form {}({})'.format(_path(obj), ','.join(
+            '{}={}'.format(name, describe(field, depth + 1, seen))
+            for name, field in unbound_fields(obj)))
+    if isinstance(obj, BaseForm):
+        return describe(obj.__class__, depth, seen)
+    if isinstance(obj, type):
+        return _path(obj)
+    if isinstance(obj, types.BuiltinFunctionType):
+        return _path(obj)
+    if isinstance(obj, (types.FunctionType, types.MethodType)):
+        return _describe_function(obj, depth, seen)
+    if depth > MAX_DEPTH:
+        return _path(obj.__class__)
+    if isinstance(obj, UnboundField):
+        return '{}({},{})'.format(_path(obj.field_class),
+                                  describe(obj.args, depth + 1, seen),
+                                  describe(obj.kwargs, depth + 1, seen))
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        items = [describe(item, depth + 1, seen) for item in obj]
+        if isinstance(obj, (set, frozenset)):
+            items.sort()
+        return '{}[{}]'.format(obj.__class__.__name__, ','.join(items))
+    if isinstance(obj, dict):
+        return '{%s}' % ','.join(sorted(
+            '{}:{}'.format(describe(k, depth + 1, seen),
+                           describe(v, depth + 1, seen))
+            for k, v in obj.items()))
+    if id(obj) in seen or _opaque(obj):
+        return _path(obj.__class__)
+    seen.add(id(obj))
+    if hasattr(obj, '__dict__'):
+        return '{}({})'.format(_path(obj.__class__),
+                               describe(vars(obj), depth + 1, seen))
+    return _ADDRESS.sub('', repr(obj))
+
+
+def _describe_view(converter, view, form_type, seen_views):
+    seen_views.add(view)
+    instance = converter._get_view(view)
+    parts = [_path(view), form_type,
+             describe(converter._get_form(instance, form_type))]
+    parts.extend(describe(getattr(instance, title, None))
+                 for title in VIEW_TITLES)
+    parts.append(describe(getattr(instance, '_conditional_relations', None)))
+    parts.append(describe(getattr(
+        instance, '%s_form_query_rel_fields' % form_type, None)))
+    for related_view in instance.related_views or []:
+        if related_view not in seen_views:
+            parts.append(_describe_view(converter, related_view, form_type,
+                                        seen_views))
+    return 'View({})'.format(','.join(parts))
+
+
+def fingerprint(converter, views, **kwargs):
+    """
+    Return the fingerprint of converting views (or a form) with converter
+    and the keyword arguments of its convert() method.
+    """
+    parts = [version, _path(converter.__class__),
+             describe(getattr(converter, 'cache_version', None)),
+             describe([converter.skip_fields, converter.subform_refs,
+                       converter.compact, converter.titles,
+                       converter.stamp_hash]),
+             # Labels can be SQL expressions, which are described by their SQL
+             describe(dict((str(k), str(v)) for k, v in
+                           getattr(converter, 'choice_labels', {}).items())),
+             describe(kwargs)]
+    if not isinstance(views, (list, tuple)):
+        views = [views]
+    for view in views:
+        if isinstance(view, (FormMeta, BaseForm)):
+            parts.append(describe(view))
+        else:
+            view = view if isinstance(view, type) else view.__class__
+            parts.append(_describe_view(converter, view,
+                                        kwargs.get('form_type', 'add'),
+                                        set()))
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
@@ -1,86 +1,79 @@
 import logging
-from .base import converts
+from .base import FieldSpec, converts
+from .cache import WeakLRUCache
 from .fab import FABConverter
+from .fingerprint import unbound_fields
+from .utils import _loaded_class
 from wtforms.form import Form
 from wtforms.fields import FormField
-from fab_addon_geoalchemy.fields import PointField
 from copy import deepcopy
 
 
 log = logging.getLogger(__name__)
 
+POINT_FIELD = 'fab_addon_geoalchemy.fields.PointField'
+
 
 class GeoFABConverter(FABConverter):
     """
     Extends the FABConverter with GeoAlchemy2 support for geographic data.
+    The PointFields of the forms of views are converted to an object with
+    a latitude and a longitude.
     """
 
-    def convert(self, views, form_type='add'):
-        log.debug("Calling GeoFABConverter.convert")
-        if not isinstance(views, list) and (isinstance(views, Form)
-                                            or issubclass(views, Form)):
-            return super(FABConverter, self).convert(views)
-        newviews = []
-        try:
-            iter(views)
-        except TypeError:
-            views = [views]
-        for view in views:
-            log.debug('Got view {}'.format(view))
-            if isinstance(view, Form):
-                log.debug('Got a form')
-                form = view
-                newviews.append(view)
-            else:
-                log.debug('Got a view')
-                view = view()
-                log.debug("Unbound fields: {}"
-                          .format(view.add_form._unbound_fields))
-                newviews.append(view)
-                form = self._get_form(view, form_type)\
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The forms with PointFields replaced, per original form class. Flask
+        # Appbuilder creates new form classes for every view instance, so
+        # they are dropped when the original is garbage collected.
+        self._point_forms = WeakLRUCache(256)
+
+    def _get_form(self, view, form_type):
+        form = super()._get_form(view, form_type)
+        point_form = self._point_forms.get(form)
+        if point_form is None:
+            point_form = self._point_forms.setdefault(
+                form, self._split_point_fields(form))
+        return point_form
 
+    def _split_point_fields(self, form):
+        """
+        Return a copy of the form class in which every PointField is
+        replaced by a subform with a latitude and a longitude field. The
+        form itself, which may be shared by other threads, is not modified.
+        """
+        PointField = _loaded_class(POINT_FIELD)
 
-            class newForm(Form):
-                pass
+        class newForm(Form):
+            pass
 
-            newfields = []
-            #for fname in dir(form):
-            for field in form():
-                fname = field.name
-                if fname.startswith('_'):
-                    continue
-                if fname in self.skip_fields:
-                    continue
-                field = getattr(form, fname)
-                if not hasattr(field, '_formfield'):
-                    continue
-                log.debug('Checking field {}'.format(fname))
-                if hasattr(field, 'field_class') and \
-                        field.field_class == PointField:
-                    log.debug("{} is a pointfield".format(fname))
-                    #  delattr(form, fname)
-                    latfield = deepcopy(field)
-                    latfield.args = ['Latitude']+list(field.args)[1:]
-                    latfield.kwargs['coordinate_type'] = 'latitude'
-                    lonfield = deepcopy(field)
-                    lonfield.args = ['Longitude']+list(field.args)[1:]
-                    lonfield.kwargs['coordinate_type'] = 'longitude'
+        newfields = []
+        for fname, field in unbound_fields(form):
+            if fname in self.skip_fields:
+                continue
+            log.debug('Checking field %s', fname)
+            if PointField is not None and \
+                    getattr(field, 'field_class', None) is PointField:
+                log.debug("%s is a pointfield", fname)
+                latfield = deepcopy(field)
+                latfield.args = ['Latitude']+list(field.args)[1:]
+                latfield.kwargs['coordinate_type'] = 'latitude'
+                lonfield = deepcopy(field)
+                lonfield.args = ['Longitude']+list(field.args)[1:]
+                lonfield.kwargs['coordinate_type'] = 'longitude'
 
-                    class subform(Form):
-                        pass
-                    subform.lat = latfield
-                    subform.lon = lonfield
-                    field = FormField(subform)
-                setattr(newForm, fname, field)
-                newfields.append((fname, field))
-            newForm._unbound_fields = newfields
-            setattr(view, '{}_form'.format(form_type), newForm)
-            log.debug('NewFields: {}'.format(newfields))
-            log.debug("Fields: {}"
-                      .format([f.name for f in self._get_form(view, form_type)()]))
-        return super().convert(newviews, form_type)
+                class subform(Form):
+                    pass
+                subform.lat = latfield
+                subform.lon = lonfield
+                field = FormField(subform)
+            setattr(newForm, fname, field)
+            newfields.append((fname, field))
+        newForm._unbound_fields = newfields
+        log.debug('NewFields: %s', newfields)
+        return newForm
 
-    @converts(PointField)
+    @converts(POINT_FIELD)
     def convert_point_field(self, field):
         fieldtype = 'string'
         options = {'format': 'coordinate_point_{}'.format(
@@ -88,4 +81,4 @@ class GeoFABConverter(FABConverter):
         vals = dict([(v.__class__, v) for v in field.validators])
         required = self._is_required(vals)
 
-        return fieldtype, options, required
+        return FieldSpec(fieldtype, options, required)
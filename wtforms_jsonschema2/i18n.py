@@ -0,0 +1,85 @@
+import logging
+from .cache import SchemaCache, WeakLRUCache, _cache_key
+from .utils import _is_lazy_string
+from .versioning import HASH_KEY, stamp
+
+log = logging.getLogger(__name__)
+
+
+def localize(node):
+    """
+    Render the lazy strings in a schema, like translated titles,
+    descriptions and enum labels, in the current locale. Subtrees without
+    lazy strings are shared with the passed schema instead of copied.
+    """
+    if isinstance(node, dict):
+        items = [(k, localize(v)) for k, v in node.items()]
+        if all(v is node[k] for k, v in items):
+            return node
+        return node.__class__(items)
+    if isinstance(node, (list, tuple)):
+        items = [localize(item) for item in node]
+        if all(a is b for a, b in zip(items, node)):
+            return node
+        return node.__class__(items)
+    if _is_lazy_string(node):
+        return str(node)
+    return node
+
+
+class LocalizedSchemaCache(object):
+    """
+    Caches schemas per locale without converting the views for every
+    locale.
+
+    Titles, descriptions and enum labels that are lazy strings (like those
+    of flask_babel.lazy_gettext) are kept lazy in the converted schema, so
+    it only holds the structure of the schema. That structure is converted
+    once and cached. Per locale, the lazy strings are rendered in a copy of
+    the structure that is cached as well, so adding a locale only costs
+    rendering its strings.
+
+    force_locale is a function returning a context manager that switches
+    the current locale, flask_babel.force_locale by default (which needs an
+    app context). Extra keyword arguments of get() are passed to the
+    convert() method of the converter, like the form_type of a FABConverter.
+
+    At most maxsize structures and maxsize localized schemas are kept.
+
+    The returned schemas are shared between callers, don't modify them.
+    """
+
+    def __init__(self, converter, force_locale=None, maxsize=128):
+        self.converter = converter
+        self.force_locale = force_locale
+        self._structures = SchemaCache(converter, maxsize=maxsize)
+        self._schemas = WeakLRUCache(maxsize)
+
+    def _locale(self, locale):
+        force_locale = self.force_locale
+        if force_locale is None:
+            from flask_babel import force_locale
+        return force_locale(locale)
+
+    def structure(self, views, **kwargs):
+        """Return the cached schema of views with lazy strings."""
+        return self._structures.get(views, **kwargs)
+
+    def get(self, views, locale, **kwargs):
+        """Return the cached schema of views in locale."""
+        key = (_cache_key(views, kwargs), str(locale))
+        schema = self._schemas.get(key)
+        if schema is None:
+            structure = self.structure(views, **kwargs)
+            log.debug('Localizing %s to %s', views, locale)
+            with self._locale(locale):
+                schema = localize(structure)
+                if schema is not structure and HASH_KEY in schema:
+                    stamp(schema)
+            self._schemas[key] = schema
+        return schema
+
+    def clear(self):
+        """Forget all schemas, for instance after the views changed."""
+        self._structures.clear()
+        self._schemas.clear()
@@ -0,0 +1,233 @@
+from collections import OrderedDict
+from collections.abc import Mapping
+from contextlib import contextmanager
+import logging
+import threading
+from .utils import _get_view_name
+from .versioning import HASH_KEY, _unescape, schema_hash
+
+log = logging.getLogger(__name__)
+
+
+class LazyDefinitions(Mapping):
+    """
+    The definitions of a LazySchema. The definition of a view is converted
+    when it is accessed for the first time, and then kept.
+    """
+
+    def __init__(self, schema):
+        self._schema = schema
+        self._converted = OrderedDict()
+        # Definitions of subforms (with subform_refs), in order of appearance
+        self._subforms = OrderedDict()
+        self._lock = threading.RLock()
+
+    @property
+    def converted(self):
+        """The names of the views that have been converted so far."""
+        return list(self._converted.keys())
+
+    @contextmanager
+    def _converting(self, name):
+        converter = self._schema.converter
+        view, parent = self._schema._views[name]
+        with converter._conversion(), \
+                converter._span('convert', name, view), \
+                converter._span('view', name, view):
+            yield view, parent
+            for k, v in converter._definitions.items():
+                self._subforms.setdefault(k, v)
+
+    def _convert(self, name):
+        log.debug('Converting definition %s', name)
+        with self._converting(name) as (view, parent):
+            _, definition = self._schema.converter._convert_view_definition(
+                view, self._schema.form_type, parent)
+        self._converted[name] = definition
+        return definition
+
+    def _partial(self, name, key, field=None):
+        """
+        Convert just the property field, or the condition with key, of the
+        definition name, without keeping it. Returns the dict holding it,
+        or None if the definition has no such condition.
+        """
+        converter = self._schema.converter
+        with self._converting(name) as (view, parent):
+            if field is not None:
+                log.debug('Converting property %s of %s', field, name)
+                _, definition = converter._convert_view_definition(
+                    view, self._schema.form_type, parent, [field])
+                return definition['properties']
+            for condition in getattr(view, '_conditional_relations', []):
+                with converter._span('condition',
+                                     condition.__class__.__name__,
+                                     condition):
+                    ckey, cval = condition.get_json_schema(view, converter)
+                if ckey == key:
+                    return {ckey: cval}
+        return None
+
+    def discard(self, name=None):
+        """
+        Forget the converted definition name, or all of them if name is
+        None, so it is converted again on the next access.
+        """
+        with self._lock:
+            if name is None:
+                self._converted.clear()
+                self._subforms.clear()
+            else:
+                self._converted.pop(name, None)
+                self._subforms.pop(name, None)
+
+    def _convert_all(self):
+        for name in self._schema._views:
+            self[name]
+
+    def __getitem__(self, name):
+        definition = self._converted.get(name)
+        if definition is not None:
+            return definition
+        with self._lock:
+            definition = self._converted.get(name)
+            if definition is not None:
+                return definition
+            if name in self._schema._views:
+                return self._convert(name)
+            if self._schema.converter.subform_refs:
+                # Subform definitions are only known after converting
+                self._convert_all()
+                return self._subforms[name]
+        raise KeyError(name)
+
+    def __contains__(self, name):
+        if name in self._schema._views:
+            return True
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        if self._schema.converter.subform_refs:
+            with self._lock:
+                self._convert_all()
+        for name in self._schema._views:
+            yield name
+        for name in list(self._subforms):
+            if name not in self._schema._views:
+                yield name
+
+    def __len__(self):
+        return sum(1 for name in self)
+
+
+class LazySchema(Mapping):
+    """
+    A read-only mapping with the same contents as the schema
+    FABConverter.convert() returns for the views, but in which the
+    definitions of the views are only converted when they are accessed.
+    Code reading schema['definitions']['Person'] only converts the Person
+    view, not its related views.
+
+    Just the views are instantiated up front, to find out their names.
+    to_dict() converts all views and returns a regular schema.
+    """
+
+    def __init__(self, converter, views, form_type='add'):
+        self.converter = converter
+        self.form_type = form_type
+        if not isinstance(views, (list, tuple)):
+            views = [views]
+        # (view, parent view) per definition name, in the order in which
+        # convert() adds them to the definitions.
+        self._views = OrderedDict()
+        properties = converter._dict()
+        for view in views:
+            view = converter._get_view(view)
+            name = _get_view_name(view)
+            self._add_view(view, None)
+            properties[name] = {'$ref': '#/definitions/%s' % name}
+        self.definitions = LazyDefinitions(self)
+        self._items = converter._dict([
+            ('type', 'object'),
+            ('definitions', self.definitions),
+            ('properties', properties)
+        ])
+
+    def _add_view(self, view, parent):
+        self._views[_get_view_name(view)] = (view, parent)
+        for related_view in view.related_views or []:
+            self._add_view(self.converter._get_view(related_view), view)
+
+    def resolve(self, pointer):
+        """
+        Return the part of the schema at a JSON pointer (RFC 6901), like
+        '/definitions/Contact/properties/country/enum', converting as
+        little as possible.
+
+        A property of a definition that wasn't converted yet only costs
+        converting that field, and the condition block of a definition
+        (like '/definitions/Contact/oneOf') only costs its conditions.
+        Other parts of a definition cost converting the definition.
+        Raises KeyError if there is nothing at the pointer.
+        """
+        if pointer and not pointer.startswith('/'):
+            raise ValueError('Invalid JSON pointer %r' % pointer)
+        tokens = [_unescape(t) for t in pointer.split('/')[1:]]
+        node = self
+        if len(tokens) > 2 and tokens[0] == 'definitions' and \
+                tokens[1] in self._views and \
+                tokens[1] not in self.definitions._converted:
+            partial = self._resolve_partial(tokens[1], tokens[2:])
+            if partial is not None:
+                node, tokens = partial
+        for token in tokens:
+            try:
+                if isinstance(node, list):
+                    node = node[int(token)]
+                else:
+                    node = node[token]
+            except (KeyError, IndexError, ValueError, TypeError):
+                raise KeyError(pointer)
+        return node
+
+    def _resolve_partial(self, name, tokens):
+        """
+        The node holding what tokens point to in the definition name and
+        the tokens left to look up in it, or None if the definition has to
+        be converted for it.
+        """
+        key = tokens[0]
+        if key == 'properties' and len(tokens) > 1:
+            node = self.definitions._partial(name, key, tokens[1])
+            return node, tokens[1:]
+        if key in ('type', 'title', 'required', 'properties'):
+            return None
+        node = self.definitions._partial(name, key)
+        if node is None:
+            return None
+        return node, tokens
+
+    def __getitem__(self, key):
+        if key == HASH_KEY and self.converter.stamp_hash:
+            return schema_hash(self.to_dict())
+        return self._items[key]
+
+    def __iter__(self):
+        yield from self._items
+        if self.converter.stamp_hash:
+            yield HASH_KEY
+
+    def __len__(self):
+        return len(self._items) + (1 if self.converter.stamp_hash else 0)
+
+    def to_dict(self):
+        """Convert all definitions and return the schema as a dict."""
+        schema = self.converter._dict(self._items)
+        schema['definitions'] = self.converter._dict(self.definitions)
+        if self.converter.stamp_hash:
+            schema[HASH_KEY] = schema_hash(schema)
+        return schema
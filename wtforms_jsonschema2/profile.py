@@ -0,0 +1,223 @@
+"""
+Profiles the schema generation of a Flask Appbuilder app, to find the views
+that are expensive to convert:
+
+    python -m wtforms_jsonschema2.profile myapp:appbuilder
+
+The argument is the import path of the AppBuilder, of the Flask app (with
+an appbuilder attribute), or of a function returning either. Every
+ModelView registered with the AppBuilder is converted under cProfile and
+tracemalloc, and the report ranks the views by time, with the memory they
+allocated, the views and forms they instantiated and their queries. It also
+lists the time and memory per converter method, the largest enums and the
+functions with the highest cumulative time.
+"""
+import argparse
+import cProfile
+from collections import OrderedDict
+import importlib
+import io
+import pstats
+import sys
+import time
+import tracemalloc
+from .stats import ConversionStats, _converter_name
+from .tracing import Tracer
+from .warmup import model_views
+
+
+class AllocationTracer(Tracer):
+    """
+    Records the memory allocated and not freed again during the conversion
+    of views and fields, in bytes. views holds the bytes per view name
+    (including its related views), methods the bytes per converter method.
+    tracemalloc must be tracing.
+    """
+
+    def __init__(self):
+        self.views = OrderedDict()
+        self.methods = OrderedDict()
+        self._started = {}
+
+    def start(self, span):
+        if span.kind in ('view', 'field'):
+            self._started[id(span)] = tracemalloc.get_traced_memory()[0]
+
+    def end(self, span):
+        started = self._started.pop(id(span), None)
+        if started is None:
+            return
+        size = tracemalloc.get_traced_memory()[0] - started
+        if span.kind == 'view':
+            self.views[span.name] = self.views.get(span.name, 0) + size
+        else:
+            name = _converter_name(span.converter, span.obj)
+            self.methods[name] = self.methods.get(name, 0) + size
+
+
+class ViewProfile(object):
+    """The cost of converting a view for a form type."""
+
+    def __init__(self, view, form_type, seconds, allocated, stats):
+        self.view = view
+        self.form_type = form_type
+        self.seconds = seconds
+        self.allocated = allocated
+        self.view_inits = stats.view_inits
+        self.form_inits = stats.form_inits
+        self.fields = sum(stats.fields.values())
+        self.queries = stats.queries
+
+
+class ProfileReport(object):
+    """
+    The result of profile_views(). views holds a ViewProfile per view and
+    form type, methods (name, calls, seconds, allocated bytes) per
+    converter method, enums the size of every enum per (view name, field
+    name), and profiler the cProfile.Profile of all conversions.
+    """
+
+    def __init__(self, views, methods, enums, profiler):
+        self.views = views
+        self.methods = methods
+        self.enums = enums
+        self.profiler = profiler
+
+    def format(self, top=10):
+        """Return the report as text, with the top items of every list."""
+        lines = ['Views by time', '{:<32} {:<6} {:>9} {:>10} {:>6} {:>6} '
+                 '{:>7} {:>7}'.format('view', 'form', 'ms', 'KiB',
+                                      'views', 'forms', 'fields', 'queries')]
+        for p in sorted(self.views, key=lambda p: -p.seconds)[:top]:
+            lines.append('{:<32} {:<6} {:>9.1f} {:>10.1f} {:>6} {:>6} {:>7} '
+                         '{:>7}'.format(p.view.__name__, p.form_type,
+                                        p.seconds * 1000, p.allocated / 1024,
+                                        p.view_inits, p.form_inits, p.fields,
+                                        p.queries))
+        lines += ['', 'Converter methods by time',
+                  '{:<40} {:>7} {:>9} {:>10}'.format('method', 'calls', 'ms',
+                                                     'KiB')]
+        for name, calls, seconds, allocated in sorted(
+                self.methods, key=lambda m: -m[2])[:top]:
+            lines.append('{:<40} {:>7} {:>9.1f} {:>10.1f}'.format(
+                name, calls, seconds * 1000, allocated / 1024))
+        lines += ['', 'Largest enums',
+                  '{:<48} {:>7}'.format('field', 'choices')]
+        for (view, field), size in sorted(self.enums.items(),
+                                          key=lambda e: -e[1])[:top]:
+            lines.append('{:<48} {:>7}'.format('%s.%s' % (view, field), size))
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats(
+            'cumulative').print_stats(top)
+        lines += ['', 'Functions by cumulative time', out.getvalue().strip()]
+        return '\n'.join(lines)
+
+
+def _method_times(profiler, converter):
+    """(name, calls, seconds) of the converter methods in a profile."""
+    methods = {}
+    for func in list(converter.converters.values()):
+        code = getattr(getattr(func, '__func__', func), '__code__', None)
+        if code is not None:
+            key = (code.co_filename, code.co_firstlineno, code.co_name)
+            methods[key] = func.__name__
+    times = []
+    for key, (cc, calls, tt, ct, callers) in \
+            pstats.Stats(profiler).stats.items():
+        if key in methods:
+            times.append((methods[key], calls, ct))
+    return times
+
+
+def profile_views(converter, views, form_types=('add',), engine=None):
+    """
+    Convert every view for every form type separately under cProfile and
+    tracemalloc, and return a ProfileReport. Queries are only counted if
+    the SQLAlchemy engine is passed.
+    """
+    stats = ConversionStats(engine=engine)
+    allocations = AllocationTracer()
+    converter.add_tracer(stats)
+    converter.add_tracer(allocations)
+    profiler = cProfile.Profile()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    results = []
+    enums = OrderedDict()
+    try:
+        for view in views:
+            for form_type in form_types:
+                before = tracemalloc.get_traced_memory()[0]
+                started = time.perf_counter()
+                profiler.enable()
+                try:
+                    converter.convert(view, form_type)
+                finally:
+                    profiler.disable()
+                seconds = time.perf_counter() - started
+                allocated = tracemalloc.get_traced_memory()[0] - before
+                results.append(ViewProfile(view, form_type, seconds,
+                                           allocated, stats))
+                for key, size in stats.enums.items():
+                    enums[key] = max(size, enums.get(key, 0))
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+        converter.tracers.remove(stats)
+        converter.tracers.remove(allocations)
+    methods = [(name, calls, seconds, allocations.methods.get(name, 0))
+               for name, calls, seconds in _method_times(profiler, converter)]
+    return ProfileReport(results, methods, enums, profiler)
+
+
+def load_appbuilder(path):
+    """
+    Import the AppBuilder at path, like 'myapp:appbuilder'. The object can
+    also be a Flask app with an appbuilder attribute, or a function
+    returning one of them.
+    """
+    module, _, attr = path.partition(':')
+    obj = getattr(importlib.import_module(module), attr or 'appbuilder')
+    if not hasattr(obj, 'baseviews') and not hasattr(obj, 'appbuilder') \
+            and callable(obj):
+        obj = obj()
+    return getattr(obj, 'appbuilder', obj)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m wtforms_jsonschema2.profile',
+        description='Profile the JSON Schema conversion of the views of a '
+                    'Flask Appbuilder app.')
+    parser.add_argument('app', help="import path of the AppBuilder, Flask "
+                                    "app or app factory, like "
+                                    "'myapp:appbuilder'")
+    parser.add_argument('--form-type', action='append', dest='form_types',
+                        choices=['add', 'edit'],
+                        help="form type to convert (default: add), can be "
+                             "repeated")
+    parser.add_argument('--geo', action='store_true',
+                        help='use the GeoFABConverter')
+    parser.add_argument('--top', type=int, default=10,
+                        help='number of items per list (default: 10)')
+    parser.add_argument('--output', help='write the cProfile stats to this '
+                                         'file, for pstats or snakeviz')
+    args = parser.parse_args(argv)
+    appbuilder = load_appbuilder(args.app)
+    if args.geo:
+        from .geofab import GeoFABConverter as Converter
+    else:
+        from .fab import FABConverter as Converter
+    with appbuilder.get_app.app_context():
+        report = profile_views(Converter(), model_views(appbuilder),
+                               form_types=args.form_types or ['add'],
+                               engine=appbuilder.get_session.get_bind())
+    print(report.format(args.top))
+    if args.output:
+        report.profiler.dump_stats(args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+from .versioning import HASH_KEY, stamp
+
+log = logging.getLogger(__name__)
+
+
+def _node_ids(node, ids):
+    if isinstance(node, dict):
+        ids.add(id(node))
+        node = list(node.values())
+    if isinstance(node, (list, tuple)):
+        for item in node:
+            _node_ids(item, ids)
+    return ids
+
+
+def _source_models(field):
+    """The classes of the objects a query field loaded its choices from."""
+    objects = getattr(field, '_object_list', None) or []
+    return frozenset(obj.__class__ for pk, obj in objects)
+
+
+class DynamicNode(object):
+    """A property of a schema produced by a dynamic converter."""
+    __slots__ = ('node', 'field', 'models', 'stale')
+
+    def __init__(self, node, field):
+        self.node = node
+        self.field = field
+        self.models = _source_models(field)
+        self.stale = False
+
+
+class RefreshableSchema(object):
+    """
+    A converted schema of which the dynamic parts can be refreshed without
+    converting it again.
+
+    The properties produced by converters marked with @dynamic, like enums
+    of QuerySelectFields and EnumFields, are recorded during
+    the conversion. refresh() converts just those fields again and updates
+    the properties in place, which only costs the choices query of each
+    field.
+
+    get() returns the schema, refreshing it first if it is older than ttl
+    seconds, or refreshing the properties that were marked stale by a
+    commit if the schema watches a session (see watch()).
+
+    Extra keyword arguments are passed to the convert() method of the
+    converter, like the form_type of a FABConverter.
+    """
+
+    def __init__(self, converter, views, ttl=None, **kwargs):
+        self.converter = converter
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions = []
+        converter._dynamic = []
+        try:
+            self.schema = converter.convert(views, **kwargs)
+            recorded = converter._dynamic
+        finally:
+            converter._dynamic = None
+        # Properties that were replaced while converting (like relations to
+        # other views) aren't part of the schema anymore.
+        ids = _node_ids(self.schema, set())
+        self.nodes = [DynamicNode(node, field) for node, field in recorded
+                      if id(node) in ids]
+        self.refreshed = time.monotonic()
+
+    def refresh(self, stale_only=False):
+        """
+        Convert the dynamic fields again and update their properties. If
+        stale_only is True, only the properties marked stale are refreshed.
+        """
+        with self._lock:
+            for dyn in self.nodes:
+                if stale_only and not dyn.stale:
+                    continue
+                self._refresh_node(dyn)
+            if not stale_only:
+                self.refreshed = time.monotonic()
+            if HASH_KEY in self.schema:
+                stamp(self.schema)
+
+    def _refresh_node(self, dyn):
+        log.debug('Refreshing %s', dyn.field.name)
+        if getattr(dyn.field, '_object_list', None) is not None:
+            # QuerySelectFields cache the objects of their query
+            dyn.field._object_list = None
+        new = self.converter.field_spec(dyn.field).to_schema()
+        for k, v in new.items():
+            old = dyn.node.get(k)
+            if isinstance(old, list) and isinstance(v, list):
+                # Update lists in place, in case they are referenced from
+                # other parts of the schema.
+                old[:] = v
+            else:
+                dyn.node[k] = v
+        dyn.models = _source_models(dyn.field) or dyn.models
+        dyn.stale = False
+
+    def get(self):
+        """Return the schema, refreshing what is outdated first."""
+        if self.ttl is not None and \
+                time.monotonic() - self.refreshed > self.ttl:
+            self.refresh()
+        elif any(dyn.stale for dyn in self.nodes):
+            self.refresh(stale_only=True)
+        return self.schema
+
+    def mark_stale(self, models=None):
+        """
+        Mark the properties with choices of one of the passed model classes
+        as stale, or all dynamic properties if models is None. Properties
+        of which the model isn't known are always marked.
+        """
+        for dyn in self.nodes:
+            if models is None or not dyn.models or dyn.models & models:
+                dyn.stale = True
+
+    def watch(self, session):
+        """
+        Mark the properties stale whose model has changed in a commit of the
+        SQLAlchemy session (or sessionmaker or scoped_session). They are
+        refreshed by the next get(), since no SQL can be sent from inside
+        the commit.
+        """
+        from sqlalchemy import event
+        changed = set()
+
+        def after_flush(session, flush_context):
+            for obj in list(session.new) + list(session.dirty) + \
+                    list(session.deleted):
+                changed.add(obj.__class__)
+
+        def after_commit(session):
+            if changed:
+                self.mark_stale(frozenset(changed))
+                changed.clear()
+
+        def after_rollback(session):
+            changed.clear()
+
+        listeners = [('after_flush', after_flush),
+                     ('after_commit', after_commit),
+                     ('after_rollback', after_rollback)]
+        for name, func in listeners:
+            event.listen(session, name, func)
+        self._sessions.append((session, listeners))
+
+    def unwatch(self):
+        """Stop watching all sessions."""
+        from sqlalchemy import event
+        for session, listeners in self._sessions:
+            for name, func in listeners:
+                event.remove(session, name, func)
+        self._sessions = []
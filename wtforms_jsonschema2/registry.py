@@ -0,0 +1,113 @@
+"""
+A registry of field converters that live outside of the converter classes.
+
+Converters are functions taking the converter and the field, returning a
+FieldSpec, just like the converter methods of BaseConverter. They can be
+registered at runtime with register_converter(), or shipped in a separate
+package through the 'wtforms_jsonschema2.converters' entry point group. The
+name of the entry point is the dotted path of the field class, the value
+the converter function:
+
+    [options.entry_points]
+    wtforms_jsonschema2.converters =
+        mypackage.fields.ColorField = mypackage.jsonschema:convert_color
+
+Plugins are only imported when a field of their class is converted for the
+first time. Converter methods of the converter class take precedence over
+runtime registrations, which take precedence over entry points.
+"""
+import logging
+import threading
+import weakref
+from .utils import _loaded_class
+
+log = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = 'wtforms_jsonschema2.converters'
+
+# Converters registered at runtime, by field class and by dotted path.
+_classes = weakref.WeakKeyDictionary()
+_paths = {}
+# Entry points by dotted path, discovered on first use.
+_entry_points = None
+_lock = threading.RLock()
+
+
+def register_converter(field_class, func):
+    """
+    Register func as the converter for field_class, which is either a class
+    or the dotted path of one.
+    """
+    if isinstance(field_class, str):
+        _paths[field_class] = func
+    else:
+        _classes[field_class] = func
+
+
+def unregister_converter(field_class):
+    """Remove a converter registered with register_converter()."""
+    if isinstance(field_class, str):
+        _paths.pop(field_class, None)
+    else:
+        _classes.pop(field_class, None)
+
+
+def _iter_entry_points():
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # python < 3.8
+        from pkg_resources import iter_entry_points
+        return iter_entry_points(ENTRY_POINT_GROUP)
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        return eps.select(group=ENTRY_POINT_GROUP)
+    return eps.get(ENTRY_POINT_GROUP, [])
+
+
+def discover():
+    """
+    Look up the entry points again, for instance after installing a plugin.
+    Plugins aren't imported until they are needed.
+    """
+    global _entry_points
+    with _lock:
+        _entry_points = dict((ep.name, ep) for ep in _iter_entry_points())
+    log.debug('Found converter entry points %s', list(_entry_points))
+    return _entry_points
+
+
+def _resolve(paths, cls):
+    for path in list(paths):
+        if _loaded_class(path) is cls:
+            return path
+    return None
+
+
+def find_converter(cls):
+    """
+    Return the registered converter function for a field class, loading it
+    from its entry point if needed, or None if there is none.
+    """
+    func = _classes.get(cls)
+    if func is not None:
+        return func
+    with _lock:
+        return _find_converter(cls)
+
+
+def _find_converter(cls):
+    func = _classes.get(cls)
+    if func is not None:
+        return func
+    path = _resolve(_paths, cls)
+    if path is not None:
+        func = _classes[cls] = _paths.pop(path)
+        return func
+    entry_points = _entry_points if _entry_points is not None else discover()
+    path = _resolve(entry_points, cls)
+    if path is not None:
+        log.debug('Loading converter plugin %s', entry_points[path])
+        func = entry_points.pop(path).load()
+        # Runtime registrations of the class still take precedence.
+        _classes.setdefault(cls, func)
+    return func
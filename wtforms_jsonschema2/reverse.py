@@ -0,0 +1,229 @@
+"""
+The reverse direction: building wtforms Form classes from the schemas this
+library produces, for services that receive the schemas and need to
+validate the same forms.
+
+    from wtforms_jsonschema2.reverse import form_class
+
+    ContactForm = form_class(schema)
+    form = ContactForm(request.form)
+
+Properties are turned into fields by their type, format and options:
+
+* string: a StringField, with a Length validator for minLength and
+  maxLength and an Email validator for the email format, a DateTimeField
+  for the date-time format, a DateField for the date format, or a
+  TextAreaField if it has no length or format
+* integer and number: an IntegerField or DecimalField, with a NumberRange
+  validator for minimum and maximum
+* boolean: a BooleanField
+* an enum: a SelectField, or a SelectMultipleField for an array of enums
+* object: a FormField with a form built from its properties
+* array: a FieldList of the field of its items, with minItems and maxItems
+
+References to definitions are resolved, and required properties get an
+InputRequired validator (the others Optional).
+"""
+import logging
+import re
+import threading
+from wtforms.form import Form
+from wtforms.fields import (StringField, TextAreaField, IntegerField,
+                            DecimalField, BooleanField, DateTimeField,
+                            DateField, SelectField, SelectMultipleField,
+                            FormField, FieldList)
+from wtforms.validators import (InputRequired, Optional, Length, NumberRange,
+                                Email)
+from .cache import WeakLRUCache
+from .exceptions import UnsupportedSchemaException
+from .versioning import HASH_KEY, schema_hash
+
+log = logging.getLogger(__name__)
+
+# The maxLength BaseConverter gives StringFields without a Length validator
+DEFAULT_MAX_LENGTH = 255
+_DEFINITIONS = '#/definitions/'
+
+
+def _class_name(name):
+    name = re.sub(r'\W', '', ''.join(part[:1].upper() + part[1:]
+                                     for part in str(name).split()))
+    if not name or name[0].isdigit():
+        return 'SchemaForm'
+    return name if name.endswith('Form') else name + 'Form'
+
+
+def _choice(value):
+    if isinstance(value, dict) and 'id' in value:
+        return (value['id'], value.get('label', value['id']))
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def _coerce(fieldtype):
+    if fieldtype == 'integer':
+        return int
+    if fieldtype == 'number':
+        # JSON numbers are floats, compare choices as floats as well
+        return float
+    return str
+
+
+class FormFactory(object):
+    """
+    Builds wtforms Form classes from schemas produced by the converters,
+    see form_class(). Built classes are cached by the content hash of the
+    schema (see wtforms_jsonschema2.versioning), so every version of a
+    schema results in a single class, no matter how often it is received.
+    The hash stored in a schema is trusted if it has one.
+
+    The classes are subclasses of base. At most maxsize classes are kept.
+    """
+
+    def __init__(self, base=Form, maxsize=128):
+        self.base = base
+        self._classes = WeakLRUCache(maxsize)
+        self._lock = threading.Lock()
+
+    def form_class(self, schema, definition=None, name=None):
+        """
+        Return the Form class of a schema, or of one of its definitions,
+        like the definition of a Flask Appbuilder view. name is the name of
+        the class, which is derived from the title by default.
+        """
+        content_hash = schema.get(HASH_KEY) or schema_hash(schema)
+        key = (content_hash, definition, name)
+        cls = self._classes.get(key)
+        if cls is None:
+            with self._lock:
+                cls = self._classes.get(key)
+                if cls is None:
+                    node = schema
+                    if definition is not None:
+                        node = schema['definitions'][definition]
+                    log.debug('Building form class for %s', definition or
+                              node.get('title'))
+                    cls = self._classes[key] = _Builder(self, schema).form(
+                        node, name or definition)
+        return cls
+
+    def clear(self):
+        """Forget all classes."""
+        self._classes.clear()
+
+    def __len__(self):
+        return len(self._classes)
+
+
+class _Builder(object):
+    """Builds the form classes of a single schema."""
+
+    def __init__(self, factory, root):
+        self.factory = factory
+        self.root = root
+        # Form classes of the referenced definitions, by name
+        self.definitions = {}
+
+    def resolve(self, node):
+        """Return the definition node refers to, and its name, if any."""
+        ref = node.get('$ref')
+        if ref is None:
+            return node, None
+        if not ref.startswith(_DEFINITIONS):
+            raise UnsupportedSchemaException(ref)
+        name = ref[len(_DEFINITIONS):]
+        return self.root['definitions'][name], name
+
+    def form(self, node, name=None):
+        attrs = {}
+        required = node.get('required', [])
+        for key, prop in node.get('properties', {}).items():
+            attrs[key] = self.field(key, prop, key in required)
+        return type(_class_name(name or node.get('title') or ''),
+                    (self.factory.base,), attrs)
+
+    def subform(self, node):
+        node, name = self.resolve(node)
+        if name is None:
+            return self.form(node)
+        if name not in self.definitions:
+            self.definitions[name] = self.form(node, name)
+        return self.definitions[name]
+
+    def field(self, key, prop, required):
+        kwargs = {'label': prop.get('title', key)}
+        if prop.get('description'):
+            kwargs['description'] = prop['description']
+        target, _ = self.resolve(prop)
+        fieldtype = prop.get('type', target.get('type'))
+        validators = [InputRequired() if required else Optional()]
+        if fieldtype == 'object' and 'enum' not in prop:
+            return FormField(self.subform(prop), **kwargs)
+        if fieldtype == 'boolean':
+            # An unchecked checkbox is sent as no value at all, so it can't
+            # be Optional
+            return BooleanField(validators=validators if required else [],
+                                **kwargs)
+        if fieldtype == 'array':
+            return self.array_field(key, prop, validators, kwargs)
+        enum = prop.get('enum', target.get('enum'))
+        if enum is not None:
+            return SelectField(choices=[_choice(c) for c in enum],
+                               coerce=_coerce(fieldtype),
+                               validators=validators, **kwargs)
+        if fieldtype == 'string':
+            return self.string_field(prop, validators, kwargs)
+        if fieldtype in ('integer', 'number'):
+            if 'minimum' in prop or 'maximum' in prop:
+                validators.append(NumberRange(prop.get('minimum'),
+                                              prop.get('maximum')))
+            cls = IntegerField if fieldtype == 'integer' else DecimalField
+            return cls(validators=validators, **kwargs)
+        raise UnsupportedSchemaException(prop)
+
+    def string_field(self, prop, validators, kwargs):
+        fmt = prop.get('format')
+        if fmt == 'date-time':
+            return DateTimeField(validators=validators, **kwargs)
+        if fmt == 'date':
+            return DateField(validators=validators, **kwargs)
+        if fmt == 'email':
+            validators.append(Email())
+        if 'minLength' in prop or \
+                prop.get('maxLength', DEFAULT_MAX_LENGTH) != \
+                DEFAULT_MAX_LENGTH:
+            validators.append(Length(prop.get('minLength', -1),
+                                     prop.get('maxLength', -1)))
+        elif 'maxLength' not in prop and fmt is None and \
+                'contentEncoding' not in prop:
+            return TextAreaField(validators=validators, **kwargs)
+        return StringField(validators=validators, **kwargs)
+
+    def array_field(self, key, prop, validators, kwargs):
+        items = prop.get('items', {})
+        if isinstance(items, list):
+            # Flask Appbuilder's multiple selects have a list of enums
+            items = items[0] if items else {}
+        target, _ = self.resolve(items)
+        if 'enum' in items or 'enum' in target:
+            enum = items.get('enum', target.get('enum'))
+            return SelectMultipleField(
+                choices=[_choice(c) for c in enum],
+                coerce=_coerce(items.get('type', target.get('type'))),
+                validators=validators, **kwargs)
+        item = self.field(key, items, False)
+        # FieldList validates the list, the entries validate themselves
+        return FieldList(item, min_entries=prop.get('minItems', 0),
+                         max_entries=prop.get('maxItems'), **kwargs)
+
+
+_factory = FormFactory()
+
+
+def form_class(schema, definition=None, name=None):
+    """
+    Return the Form class of a schema, or of one of its definitions, from
+    a process wide FormFactory.
+    """
+    return _factory.form_class(schema, definition, name)
@@ -0,0 +1,152 @@
+"""
+Sharded output of schemas, for apps with so many views that a single schema
+is too big to generate, cache and download as one unit.
+
+Every definition of the schema becomes a document of its own, a shard, and
+references between definitions become references between the documents. A
+small index lists the shards with their hashes, so clients can fetch only
+the shards they use, and only again when their hash changed.
+"""
+import logging
+import os
+import tempfile
+import threading
+from .versioning import schema_hash, stamp
+
+log = logging.getLogger(__name__)
+
+# The key in the index that lists the shards.
+SHARDS_KEY = 'x-shards'
+_DEFINITIONS = '#/definitions/'
+
+
+def _rewrite_refs(node, ref_format):
+    """
+    Return a copy of node in which the references to definitions point to
+    their shard. Subtrees without references are shared with node.
+    """
+    if isinstance(node, dict):
+        items = []
+        for k, v in node.items():
+            if k == '$ref' and isinstance(v, str) and \
+                    v.startswith(_DEFINITIONS):
+                name, _, rest = v[len(_DEFINITIONS):].partition('/')
+                v = ref_format.format(name) + ('#/' + rest if rest else '')
+            else:
+                v = _rewrite_refs(v, ref_format)
+            items.append((k, v))
+        if all(v is node[k] for k, v in items):
+            return node
+        return node.__class__(items)
+    if isinstance(node, (list, tuple)):
+        items = [_rewrite_refs(item, ref_format) for item in node]
+        if all(a is b for a, b in zip(items, node)):
+            return node
+        return node.__class__(items)
+    return node
+
+
+class ShardedSchema(object):
+    """
+    The schema of FAB views as one document per definition.
+
+    shard(name) converts just the view of that definition (see
+    wtforms_jsonschema2.lazy) and returns it as a standalone schema, in which
+    references to other definitions point to their shard, like
+    {'$ref': 'Picture.json'}. ref_format turns the name of a definition into
+    the location of its shard, relative to the other shards.
+
+    index() returns a schema referring to the shards of the views, with the
+    location and hash of every shard under 'x-shards'. It converts all
+    shards, which are kept until invalidate() is called for them.
+    """
+
+    def __init__(self, converter, views, form_type='add',
+                 ref_format='{}.json'):
+        self.converter = converter
+        self.ref_format = ref_format
+        self.lazy = converter.convert_lazy(views, form_type)
+        self._shards = {}
+        self._lock = threading.RLock()
+
+    @property
+    def names(self):
+        """The names of the shards."""
+        return list(self.lazy['definitions'])
+
+    def path(self, name):
+        """The location of the shard of a definition."""
+        return self.ref_format.format(name)
+
+    def shard(self, name):
+        """Return the shard of the definition name."""
+        shard = self._shards.get(name)
+        if shard is not None:
+            return shard
+        with self._lock:
+            shard = self._shards.get(name)
+            if shard is None:
+                log.debug('Generating shard %s', name)
+                definition = self.lazy['definitions'][name]
+                shard = _rewrite_refs(definition, self.ref_format)
+                if shard is definition:
+                    shard = self.converter._dict(definition)
+                if self.converter.stamp_hash:
+                    stamp(shard)
+                self._shards[name] = shard
+        return shard
+
+    def index(self):
+        """Return the index of the shards."""
+        converter = self.converter
+        index = converter._dict([('type', 'object')])
+        index['properties'] = _rewrite_refs(self.lazy['properties'],
+                                            self.ref_format)
+        shards = converter._dict()
+        for name in self.names:
+            shards[name] = converter._dict([
+                ('path', self.path(name)),
+                ('hash', schema_hash(self.shard(name)))
+            ])
+        index[SHARDS_KEY] = shards
+        if converter.stamp_hash:
+            stamp(index)
+        return index
+
+    def invalidate(self, name=None):
+        """
+        Forget the shard of the definition name, or all shards if name is
+        None, so it's converted again.
+        """
+        with self._lock:
+            if name is None:
+                self._shards.clear()
+            else:
+                self._shards.pop(name, None)
+            self.lazy['definitions'].discard(name)
+
+    def write(self, directory, index_name='index.json'):
+        """
+        Write the shards and the index as JSON files to directory, and
+        return the index. Files are replaced atomically, so clients never
+        read a partial shard.
+        """
+        index = self.index()
+        for name in self.names:
+            self._write(directory, self.path(name), self.shard(name))
+        self._write(directory, index_name, index)
+        return index
+
+    def _write(self, directory, path, schema):
+        path = os.path.join(directory, path)
+        dirname = os.path.dirname(path) or '.'
+        os.makedirs(dirname, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.converter.dumps(schema))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        log.debug('Wrote %s', path)
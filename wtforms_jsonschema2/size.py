@@ -0,0 +1,198 @@
+"""
+Analyzes where the bytes of a schema go, and checks schemas against size
+budgets, to keep them small enough for clients on slow connections:
+
+    python -m wtforms_jsonschema2.size schema.json --budget 100000
+
+Sizes are the number of bytes of the compact JSON serialization, as sent by
+a converter in compact mode.
+"""
+import argparse
+from collections import OrderedDict
+from collections.abc import Mapping
+import json
+import logging
+import sys
+from .dedup import find_duplicates
+from .exceptions import SchemaBudgetExceeded
+from .utils import _json_default
+from .versioning import _escape
+
+log = logging.getLogger(__name__)
+
+
+def _scalar_size(value):
+    return len(json.dumps(value, default=_json_default).encode('utf-8'))
+
+
+class SizeReport(object):
+    """
+    The sizes of the parts of a schema, see analyze(). All sizes are in
+    bytes and keyed by JSON pointer:
+
+    * total: the size of the whole schema
+    * definitions: the size of every definition, by name
+    * properties: the size of every property, including nested ones
+    * enums: (size, number of choices) of the enum of every property
+
+    duplicates lists (kind, pointers, size, wasted) for every subtree that
+    occurs more than once (see wtforms_jsonschema2.dedup), where wasted is
+    the number of bytes the repeats take, largest first.
+    """
+
+    def __init__(self, schema, min_size=64):
+        self.schema = schema
+        self.min_size = min_size
+        self.definitions = OrderedDict()
+        self.properties = OrderedDict()
+        self.enums = OrderedDict()
+        self._pointers = {}
+        self._duplicates = None
+        self.total = self._size(schema, '', None, None)
+
+    def _size(self, node, pointer, parent, key):
+        if isinstance(node, Mapping):
+            # Subforms can share nodes, which then occur at several pointers
+            self._pointers.setdefault(id(node), []).append(pointer)
+            size = 2 + max(0, len(node) - 1)
+            for k, v in node.items():
+                size += _scalar_size(str(k)) + 1 + \
+                    self._size(v, pointer + '/' + _escape(k), pointer, k)
+        elif isinstance(node, (list, tuple)):
+            size = 2 + max(0, len(node) - 1)
+            for i, item in enumerate(node):
+                size += self._size(item, '%s/%d' % (pointer, i), pointer, i)
+        else:
+            return _scalar_size(node)
+        if parent == '/definitions':
+            self.definitions[key] = size
+        elif parent is not None and parent.endswith('/properties'):
+            self.properties[pointer] = size
+        elif key == 'enum' and isinstance(node, (list, tuple)):
+            self.enums[parent] = (size, len(node))
+        return size
+
+    @property
+    def duplicates(self):
+        if self._duplicates is None:
+            duplicates = []
+            for kind, nodes, hint, size in \
+                    find_duplicates(self.schema, self.min_size).values():
+                pointers = []
+                seen = {}
+                for node in nodes:
+                    occurrences = self._pointers[id(node)]
+                    i = seen[id(node)] = seen.get(id(node), -1) + 1
+                    pointers.append(occurrences[min(i, len(occurrences) - 1)])
+                duplicates.append((kind, pointers, size,
+                                   size * (len(nodes) - 1)))
+            duplicates.sort(key=lambda d: -d[3])
+            self._duplicates = duplicates
+        return self._duplicates
+
+    def largest(self, n=10):
+        """
+        Return the n largest (pointer, size) of the properties and enums.
+        """
+        items = list(self.properties.items()) + \
+            [(p + '/enum', size) for p, (size, count) in self.enums.items()]
+        items.sort(key=lambda item: -item[1])
+        return items[:n]
+
+    def format(self, top=10):
+        """Return the report as text, with the top items of every list."""
+        lines = ['Total: %d bytes' % self.total, '', 'Definitions']
+        for name, size in sorted(self.definitions.items(),
+                                 key=lambda item: -item[1])[:top]:
+            lines.append('{:<60} {:>10}'.format(name, size))
+        lines += ['', 'Largest properties and enums']
+        for pointer, size in self.largest(top):
+            lines.append('{:<60} {:>10}'.format(pointer, size))
+        lines += ['', 'Duplicated subtrees']
+        for kind, pointers, size, wasted in self.duplicates[:top]:
+            lines.append('{:<6} {:>4}x {:>8} bytes, {:>8} wasted: {}'.format(
+                kind, len(pointers), size, wasted, ', '.join(pointers)))
+        return '\n'.join(lines)
+
+
+def analyze(schema, min_size=64):
+    """
+    Return a SizeReport of a schema (or a lazy schema, which is converted
+    completely). Duplicated subtrees smaller than min_size bytes are not
+    reported.
+    """
+    if not isinstance(schema, dict) and hasattr(schema, 'to_dict'):
+        schema = schema.to_dict()
+    return SizeReport(schema, min_size)
+
+
+def check_budget(schema, budget=None, definition_budgets=None,
+                 on_budget='warn'):
+    """
+    Check the size of a schema against a budget in bytes for the whole
+    schema, and budgets per definition name in definition_budgets, where
+    the budget of '*' applies to the definitions that aren't listed.
+
+    Returns the (name, size, budget) of every part over its budget, with
+    name None for the whole schema. If there are any, a warning is logged,
+    or SchemaBudgetExceeded is raised if on_budget is 'raise'.
+    """
+    report = schema if isinstance(schema, SizeReport) else analyze(schema)
+    definition_budgets = definition_budgets or {}
+    exceeded = []
+    if budget is not None and report.total > budget:
+        exceeded.append((None, report.total, budget))
+    for name, size in report.definitions.items():
+        limit = definition_budgets.get(name, definition_budgets.get('*'))
+        if limit is not None and size > limit:
+            exceeded.append((name, size, limit))
+    if exceeded:
+        if on_budget == 'raise':
+            raise SchemaBudgetExceeded(exceeded)
+        log.warning('Schema is over its size budget: %s', exceeded)
+    return exceeded
+
+
+def _definition_budget(value):
+    name, _, size = value.rpartition('=')
+    if not name:
+        raise argparse.ArgumentTypeError('expected NAME=BYTES')
+    return name, int(size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m wtforms_jsonschema2.size',
+        description='Report the size of the parts of JSON Schemas and check '
+                    'them against budgets.')
+    parser.add_argument('files', nargs='+', help='JSON Schema files')
+    parser.add_argument('--budget', type=int,
+                        help='maximum size of a schema in bytes')
+    parser.add_argument('--definition-budget', type=_definition_budget,
+                        action='append', default=[], metavar='NAME=BYTES',
+                        help="maximum size of a definition, '*' for all "
+                             "definitions, can be repeated")
+    parser.add_argument('--min-size', type=int, default=64,
+                        help='smallest duplicated subtree to report')
+    parser.add_argument('--top', type=int, default=10,
+                        help='number of items per list (default: 10)')
+    args = parser.parse_args(argv)
+    over = False
+    for path in args.files:
+        with open(path) as f:
+            report = analyze(json.load(f, object_pairs_hook=OrderedDict),
+                             args.min_size)
+        print(path)
+        print(report.format(args.top))
+        exceeded = check_budget(report, args.budget,
+                                dict(args.definition_budget))
+        for name, size, budget in exceeded:
+            print('OVER BUDGET: {} is {} bytes, the budget is {}'.format(
+                name or 'schema', size, budget))
+        over = over or bool(exceeded)
+        print()
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+from collections import OrderedDict
+import logging
+import threading
+from .base import _conversion_state
+from .tracing import Tracer
+from .exceptions import QueryBudgetExceeded
+
+log = logging.getLogger(__name__)
+
+
+def _converter_name(converter, field):
+    """The name of the converter method of a field, or of its class."""
+    func = converter._find_converter(field.__class__)
+    return func.__name__ if func is not None else field.__class__.__name__
+
+
+class ConversionStats(Tracer):
+    """
+    Collects statistics about the last conversion of a converter. Add it to
+    the converter with converter.add_tracer(stats).
+
+    After a conversion, the following are available:
+
+    * views: the number of converted views
+    * view_inits and form_inits: the number of instantiated views and forms
+    * fields: the number of converted fields per converter method
+    * cache_hits and cache_misses: per cache of the converter
+    * enums: the size of every enum per (view name, field name)
+    * queries: the number of SQL queries issued
+    * view_queries: the number of SQL queries per view
+
+    The statistics are kept per thread, so a ConversionStats can be added
+    to a converter that is shared between threads: they are those of the
+    last conversion of the current thread, and are None in threads that
+    haven't converted anything yet.
+
+    Queries are counted through the events of the SQLAlchemy engine that
+    is passed, so they are only counted if an engine is given. Only the
+    queries of the thread running the conversion are counted. The engine
+    listener is registered while any thread is converting. If query_budget
+    is set, a conversion issuing more queries than that logs a warning, or
+    raises QueryBudgetExceeded if on_budget is 'raise'.
+    """
+    views = _conversion_state('views')
+    view_inits = _conversion_state('view_inits')
+    form_inits = _conversion_state('form_inits')
+    fields = _conversion_state('fields')
+    cache_hits = _conversion_state('cache_hits')
+    cache_misses = _conversion_state('cache_misses')
+    enums = _conversion_state('enums')
+    queries = _conversion_state('queries')
+    view_queries = _conversion_state('view_queries')
+    # The converter of the conversion running in the current thread.
+    _converter = _conversion_state('converter')
+
+    def __init__(self, engine=None, query_budget=None, on_budget='warn'):
+        self.engine = engine
+        self.query_budget = query_budget
+        self.on_budget = on_budget
+        self._local = threading.local()
+        # The number of running conversions, while the engine is listened to
+        self._running = 0
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.views = 0
+        self.view_inits = 0
+        self.form_inits = 0
+        self.fields = OrderedDict()
+        self.cache_hits = OrderedDict()
+        self.cache_misses = OrderedDict()
+        self.enums = OrderedDict()
+        self.queries = 0
+        self.view_queries = OrderedDict()
+
+    def as_dict(self):
+        return OrderedDict([
+            ('views', self.views),
+            ('view_inits', self.view_inits),
+            ('form_inits', self.form_inits),
+            ('fields', self.fields),
+            ('cache_hits', self.cache_hits),
+            ('cache_misses', self.cache_misses),
+            ('enums', self.enums),
+            ('queries', self.queries),
+            ('view_queries', self.view_queries),
+        ])
+
+    def start(self, span):
+        if span.kind == 'convert' and span.parent is None:
+            self.reset()
+            self._converter = span.converter
+            if self.engine is not None:
+                self._listen()
+        elif span.kind == 'view':
+            self.views += 1
+        elif span.kind == 'view_init':
+            self.view_inits += 1
+        elif span.kind == 'form_init':
+            self.form_inits += 1
+        elif span.kind == 'field':
+            name = _converter_name(span.converter, span.obj)
+            self.fields[name] = self.fields.get(name, 0) + 1
+
+    def end(self, span):
+        if span.kind != 'convert' or span.parent is not None:
+            return
+        self._converter = None
+        if self.engine is not None:
+            self._unlisten()
+        if self.query_budget is not None and \
+                self.queries > self.query_budget:
+            if self.on_budget == 'raise':
+                raise QueryBudgetExceeded(self.queries, self.query_budget)
+            log.warning('Conversion issued %d queries, the budget is %d: %s',
+                        self.queries, self.query_budget,
+                        dict(self.view_queries))
+
+    def _listen(self):
+        """Listen to the queries of the engine, once for all threads."""
+        with self._lock:
+            if self._running == 0:
+                from sqlalchemy import event
+                event.listen(self.engine, 'before_cursor_execute',
+                             self._count_query)
+            self._running += 1
+
+    def _unlisten(self):
+        with self._lock:
+            self._running -= 1
+            if self._running == 0:
+                from sqlalchemy import event
+                event.remove(self.engine, 'before_cursor_execute',
+                             self._count_query)
+
+    def event(self, span, kind, name, obj=None):
+        if kind == 'cache_hit':
+            self.cache_hits[name] = self.cache_hits.get(name, 0) + 1
+        elif kind == 'cache_miss':
+            self.cache_misses[name] = self.cache_misses.get(name, 0) + 1
+        elif kind == 'spec' and obj.options:
+            enum = obj.options.get('enum')
+            if enum is None and isinstance(obj.options.get('items'), list):
+                enum = obj.options['items'][0].get('enum')
+            if enum is not None:
+                self.enums[(self._view_name(span), name)] = len(enum)
+
+    def _view_name(self, span):
+        while span is not None and span.kind != 'view':
+            span = span.parent
+        return span.name if span is not None else None
+
+    def _count_query(self, conn, cursor, statement, parameters, context,
+                     executemany):
+        if self._converter is None:
+            # A query of another thread
+            return
+        self.queries += 1
+        view = self._view_name(self._converter._current_span)
+        self.view_queries[view] = self.view_queries.get(view, 0) + 1
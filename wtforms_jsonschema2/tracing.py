@@ -0,0 +1,119 @@
+from collections import OrderedDict
+import time
+
+
+class Span(object):
+    """
+    A timed part of a conversion. kind is one of:
+
+    * convert: a call to convert()
+    * view: the conversion of a Flask Appbuilder view
+    * view_init: the instantiation of a view
+    * condition: the conversion of a condition of a view
+    * form: the conversion of a form or subform
+    * form_init: the instantiation of a form
+    * field: the conversion of a field
+    * choices: loading the choices of a field from the database
+
+    name is the name of the view, form or field and obj the view, form or
+    field itself. parent is the span this span is part of.
+    """
+    __slots__ = ('converter', 'kind', 'name', 'obj', 'parent')
+
+    def __init__(self, converter, kind, name, obj=None):
+        self.converter = converter
+        self.kind = kind
+        self.name = name
+        self.obj = obj
+        self.parent = None
+
+    def __repr__(self):
+        return 'Span({!r}, {!r})'.format(self.kind, self.name)
+
+    def find(self, kind):
+        """Return the closest span of kind this span is part of."""
+        span = self.parent
+        while span is not None and span.kind != kind:
+            span = span.parent
+        return span
+
+    def __enter__(self):
+        self.parent = self.converter._current_span
+        self.converter._current_span = self
+        for tracer in self.converter.tracers:
+            tracer.start(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.converter._current_span = self.parent
+        for tracer in self.converter.tracers:
+            tracer.end(self)
+        return False
+
+
+class _NoSpan(object):
+    """Used instead of a Span when no tracers are registered."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+class Tracer(object):
+    """
+    Base class for tracers, which are notified of the start and end of every
+    span of a conversion. Register a tracer with converter.add_tracer().
+
+    Tracers are also notified of events that happen during a span:
+
+    * spec: a field was converted, obj is the resulting FieldSpec
+    * cache_hit and cache_miss: a conversion was (not) found in a cache of
+      the converter, name is the name of the cache
+    """
+
+    def start(self, span):
+        pass
+
+    def end(self, span):
+        pass
+
+    def event(self, span, kind, name, obj=None):
+        pass
+
+
+class TimingTracer(Tracer):
+    """
+    Records how long conversions take, in seconds. kinds holds the total
+    time spent per span kind, views the time per view and fields the time
+    per (view name, field name). Fields of forms that aren't part of a view
+    are recorded with view name None.
+    """
+
+    def __init__(self):
+        self.kinds = OrderedDict()
+        self.views = OrderedDict()
+        self.fields = OrderedDict()
+        self._started = {}
+
+    def start(self, span):
+        self._started[id(span)] = time.perf_counter()
+
+    def end(self, span):
+        duration = time.perf_counter() - self._started.pop(id(span))
+        self.kinds[span.kind] = self.kinds.get(span.kind, 0) + duration
+        if span.kind == 'view':
+            self.views[span.name] = self.views.get(span.name, 0) + duration
+        elif span.kind == 'field':
+            view = span.find('view')
+            key = (view.name if view is not None else None, span.name)
+            self.fields[key] = self.fields.get(key, 0) + duration
+
+    def slowest_fields(self, n=10):
+        """Return the n slowest ((view name, field name), seconds)."""
+        return sorted(self.fields.items(), key=lambda item: -item[1])[:n]
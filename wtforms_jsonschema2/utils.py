@@ -1,9 +1,20 @@
 import re
+import json
+import hashlib
 import logging
+import sys
+from collections.abc import Mapping
+from decimal import Decimal
 
 
 log = logging.getLogger(__name__)
 
+# The classes of lazy (translated) strings of the common i18n libraries.
+LAZY_STRING_CLASSES = ('flask_babel.speaklater.LazyString',
+                       'flask_babelex.speaklater._LazyString',
+                       'speaklater._LazyString',
+                       'babel.support.LazyProxy')
+
 
 def _get_related_view_property(view, related_view, field):
     """
@@ -11,8 +22,8 @@ def _get_related_view_property(view, related_view, field):
     into a property for jsonschema.
     """
     defin = {}
-    log.debug('Checking view {}, related view {} and field {}'
-              .format(view, related_view, field))
+    log.debug('Checking view %s, related view %s and field %s',
+              view, related_view, field)
     if view.datamodel.is_relation_one_to_one(field):
         log.debug('Got a one-to-one relation')
         title = obj_name = _get_pretty_name(related_view, 'show')\
@@ -34,11 +45,11 @@ def _get_related_view_property(view, related_view, field):
 
 
 def _is_parent_related_view_property(view, parent_view, field):
-    log.debug('Checking parent related property for {}, parent {} and field {}'
-              .format(view, parent_view, field))
+    log.debug('Checking parent related property for %s, parent %s and '
+              'field %s', view, parent_view, field)
     if view.datamodel.is_relation(field):
         parent_properties = parent_view.datamodel.get_related_fks([view])
-        log.debug('parent properties: {}'.format(parent_properties))
+        log.debug('parent properties: %s', parent_properties)
         return field in parent_properties
     else:
         return False
@@ -67,3 +78,74 @@ def _get_pretty_name(view, form_type):
         return view.edit_title
     else:
         return re.sub('[Vv]iew', '', view.__class__.__name__)
+
+
+def _json_default(obj):
+    """
+    Serialize the values json doesn't know about, like the Decimals of
+    NumberRange validators, lazy (translated) strings and lazy schemas.
+    """
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    return str(obj)
+
+
+def _copy_tree(node, copies=None):
+    """
+    Copy the dicts and lists of a schema. Unlike deepcopy, this does not
+    preserve shared subtrees, so every occurrence can be changed by itself.
+    If copies is a dict, the copy of every dict is added to it by the id of
+    the original.
+    """
+    if isinstance(node, dict):
+        copy = node.__class__((k, _copy_tree(v, copies))
+                              for k, v in node.items())
+        if copies is not None:
+            copies[id(node)] = copy
+        return copy
+    if isinstance(node, list):
+        return [_copy_tree(item, copies) for item in node]
+    return node
+
+
+def _canonical_json(obj):
+    """
+    Serialize a (part of a) schema to a canonical JSON string. Keys are
+    sorted and whitespace is stripped, so structurally equal schemas always
+    serialize to the same string, regardless of dict ordering.
+    """
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def _schema_digest(obj):
+    """Return a hex digest of the canonical JSON version of obj."""
+    return hashlib.sha1(_canonical_json(obj).encode('utf-8')).hexdigest()
+
+
+def _loaded_class(path):
+    """
+    Return the class with the dotted path, or None if its module hasn't been
+    imported. Nothing is imported: if the module isn't loaded, no instances
+    of the class can exist either.
+    """
+    module, _, name = path.rpartition('.')
+    module = sys.modules.get(module)
+    return getattr(module, name, None) if module is not None else None
+
+
+def _is_lazy_string(obj):
+    """Whether obj is a lazy string, which is translated when rendered."""
+    if isinstance(obj, str):
+        return False
+    for path in LAZY_STRING_CLASSES:
+        cls = _loaded_class(path)
+        if cls is not None and isinstance(obj, cls):
+            return True
+    return False
+
+
+def _text(obj):
+    """Return obj as a string, keeping lazy strings lazy."""
+    return obj if _is_lazy_string(obj) else str(obj)
@@ -0,0 +1,196 @@
+from collections import OrderedDict
+import hashlib
+import logging
+from .utils import _canonical_json, _copy_tree
+
+log = logging.getLogger(__name__)
+
+# The key in the root of a schema that holds its content hash.
+HASH_KEY = 'x-schema-hash'
+
+
+def schema_hash(schema):
+    """
+    Return the canonical content hash of a schema. The hash does not depend
+    on the order of keys, and the hash stored in the schema itself is
+    ignored.
+    """
+    if HASH_KEY in schema:
+        schema = dict((k, v) for k, v in schema.items() if k != HASH_KEY)
+    return hashlib.sha256(_canonical_json(schema).encode('utf-8')).hexdigest()
+
+
+def stamp(schema):
+    """Store the content hash of a schema in the schema and return it."""
+    schema[HASH_KEY] = schema_hash(schema)
+    return schema[HASH_KEY]
+
+
+def _escape(key):
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def _unescape(token):
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def _equal(a, b):
+    # 1 == True and 1 == 1.0 in python, but not in JSON
+    return type(a) is type(b) and _canonical_json(a) == _canonical_json(b)
+
+
+def make_patch(old, new):
+    """
+    Compute the RFC 6902 JSON Patch that turns the old schema into the new
+    one. Only add, remove and replace operations are generated. Items
+    added to or removed from a list (like an enum that grew by a row) result
+    in a single operation, wherever they are in the list.
+    """
+    ops = []
+    _diff(old, new, '', ops)
+    return ops
+
+
+def _diff(old, new, path, ops):
+    if isinstance(old, dict) and isinstance(new, dict):
+        for k in old.keys():
+            if k not in new:
+                ops.append(OrderedDict([('op', 'remove'),
+                                        ('path', path + '/' + _escape(k))]))
+        for k, v in new.items():
+            subpath = path + '/' + _escape(k)
+            if k not in old:
+                ops.append(OrderedDict([('op', 'add'), ('path', subpath),
+                                        ('value', v)]))
+            else:
+                _diff(old[k], v, subpath, ops)
+    elif isinstance(old, list) and isinstance(new, list):
+        _diff_list(old, new, path, ops)
+    elif not _equal(old, new):
+        ops.append(OrderedDict([('op', 'replace'), ('path', path),
+                                ('value', new)]))
+
+
+def _diff_list(old, new, path, ops):
+    # Strip the common start and end of both lists, and diff what remains.
+    start = 0
+    while start < min(len(old), len(new)) and _equal(old[start], new[start]):
+        start += 1
+    end = 0
+    while end < min(len(old), len(new)) - start and \
+            _equal(old[-end - 1], new[-end - 1]):
+        end += 1
+    old_middle = old[start:len(old) - end]
+    new_middle = new[start:len(new) - end]
+    common = min(len(old_middle), len(new_middle))
+    for i in range(common):
+        _diff(old_middle[i], new_middle[i], '%s/%d' % (path, start + i), ops)
+    for i in range(common, len(new_middle)):
+        ops.append(OrderedDict([('op', 'add'),
+                                ('path', '%s/%d' % (path, start + i)),
+                                ('value', new_middle[i])]))
+    for i in range(common, len(old_middle)):
+        # Every removal shifts the rest of the list to the left.
+        ops.append(OrderedDict([('op', 'remove'),
+                                ('path', '%s/%d' % (path, start + common))]))
+
+
+def apply_patch(doc, patch):
+    """
+    Apply a JSON Patch with add, remove and replace operations to a copy of
+    doc and return the patched copy.
+    """
+    doc = _copy_tree(doc)
+    for op in patch:
+        tokens = [_unescape(t) for t in op['path'].split('/')[1:]]
+        if len(tokens) == 0:
+            if op['op'] != 'replace':
+                raise ValueError("Can't {} the root of a document"
+                                 .format(op['op']))
+            doc = _copy_tree(op['value'])
+            continue
+        parent = doc
+        for token in tokens[:-1]:
+            parent = parent[int(token) if isinstance(parent, list)
+                            else token]
+        key = tokens[-1]
+        if isinstance(parent, list):
+            key = len(parent) if key == '-' else int(key)
+        if op['op'] == 'add':
+            if isinstance(parent, list):
+                parent.insert(key, _copy_tree(op['value']))
+            else:
+                parent[key] = _copy_tree(op['value'])
+        elif op['op'] == 'remove':
+            del parent[key]
+        elif op['op'] == 'replace':
+            parent[key] = _copy_tree(op['value'])
+        else:
+            raise ValueError("Unsupported JSON Patch operation {}"
+                             .format(op['op']))
+    return doc
+
+
+class SchemaHistory:
+    """
+    Keeps the last max_versions versions of a schema, so clients that
+    already have one of them can be sent a JSON Patch instead of the full
+    schema.
+    """
+
+    def __init__(self, max_versions=10):
+        self.max_versions = max_versions
+        self.versions = OrderedDict()
+        self._patches = {}
+
+    @property
+    def current(self):
+        """The hash of the latest version."""
+        if len(self.versions) == 0:
+            return None
+        return next(reversed(self.versions))
+
+    def add(self, schema):
+        """
+        Add a new version of the schema, stamping it with its content hash.
+        Returns the hash.
+        """
+        version = stamp(schema)
+        if version in self.versions:
+            self.versions.move_to_end(version)
+        else:
+            self.versions[version] = schema
+        while len(self.versions) > self.max_versions:
+            old_version, _ = self.versions.popitem(last=False)
+            log.debug('Dropping schema version %s', old_version)
+        self._patches = dict((k, v) for k, v in self._patches.items()
+                             if k[0] in self.versions)
+        return version
+
+    def patch(self, version):
+        """
+        Return the JSON Patch from version to the current version, or None
+        if that version is unknown.
+        """
+        if version not in self.versions:
+            return None
+        key = (version, self.current)
+        if key not in self._patches:
+            self._patches[key] = make_patch(self.versions[version],
+                                            self.versions[self.current])
+        return self._patches[key]
+
+    def delta(self, version=None):
+        """
+        Return what a client having the passed version needs to get the
+        current version: a dict with the current hash and either the JSON
+        Patch under 'patch', or the full schema under 'schema' if the
+        version is unknown or the patch would be larger than the schema.
+        """
+        current = self.current
+        patch = self.patch(version) if version is not None else None
+        if patch is not None and len(_canonical_json(patch)) < \
+                len(_canonical_json(self.versions[current])):
+            return OrderedDict([('hash', current), ('patch', patch)])
+        return OrderedDict([('hash', current),
+                            ('schema', self.versions[current])])
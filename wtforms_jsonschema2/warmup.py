@@ -0,0 +1,130 @@
+import logging
+import threading
+from .cache import SchemaCache
+
+log = logging.getLogger(__name__)
+
+
+def model_views(appbuilder):
+    """
+    Return the classes of the ModelViews registered with an AppBuilder,
+    except those of Flask Appbuilder itself (like the security views).
+    """
+    from flask_appbuilder import ModelView
+    views = []
+    for view in appbuilder.baseviews:
+        cls = view if isinstance(view, type) else view.__class__
+        if not issubclass(cls, ModelView) or cls in views or \
+                cls.__module__.startswith('flask_appbuilder.'):
+            continue
+        views.append(cls)
+    return views
+
+
+class SchemaWarmer(object):
+    """
+    Converts the schemas of all ModelViews of a Flask Appbuilder app into a
+    SchemaCache in a background thread, so the first requests for them are
+    served from the cache.
+
+    cache is a SchemaCache or a converter to create one for. The views
+    registered with the AppBuilder are warmed for every form type in
+    form_types, except those of Flask Appbuilder itself (like the security
+    views), unless a list of views is passed.
+
+    Start the warm-up after the views are added to the AppBuilder:
+
+        warmer = SchemaWarmer(FABConverter(), appbuilder)
+        warmer.start()
+
+    done and total tell how far the warm-up is, and progress is called
+    with (done, total, view, form_type) after each schema. ready is set when
+    the warm-up has finished, and errors holds (view, form_type, exception)
+    for the schemas that failed. If the warm-up itself failed, failed holds
+    the exception, which is in errors as well with view and form_type None.
+
+    Without an appbuilder, the views are converted outside of an app
+    context.
+    """
+
+    def __init__(self, cache, appbuilder=None, form_types=('add', 'edit'),
+                 views=None, progress=None):
+        if not isinstance(cache, SchemaCache):
+            cache = SchemaCache(cache)
+        self.cache = cache
+        self.form_types = form_types
+        self.views = views
+        self.progress = progress
+        self.appbuilder = None
+        self.ready = threading.Event()
+        self.done = 0
+        self.total = 0
+        self.errors = []
+        self.failed = None
+        self._thread = None
+        if appbuilder is not None:
+            self.init_app(appbuilder)
+
+    def init_app(self, appbuilder):
+        self.appbuilder = appbuilder
+        appbuilder.get_app.extensions['wtforms_jsonschema2'] = self
+
+    def model_views(self):
+        """Return the view classes to warm."""
+        if self.views is not None:
+            return list(self.views)
+        return model_views(self.appbuilder)
+
+    def start(self):
+        """Start warming the cache in a background thread."""
+        if self._thread is not None:
+            return self._thread
+        self._thread = threading.Thread(target=self.run,
+                                        name='wtforms_jsonschema2-warmup',
+                                        daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def wait(self, timeout=None):
+        """
+        Wait until the warm-up is done. Returns whether it is, and didn't
+        fail.
+        """
+        return self.ready.wait(timeout) and self.failed is None
+
+    def run(self):
+        """Warm the cache in the current thread."""
+        try:
+            if self.appbuilder is not None:
+                with self.appbuilder.get_app.app_context():
+                    self._run()
+            else:
+                self._run()
+        except Exception as e:
+            log.exception('Failed to warm the schemas')
+            self.failed = e
+            self.errors.append((None, None, e))
+        finally:
+            self.ready.set()
+        log.info('Warmed %d schemas, %d failed', self.done - len(self.errors),
+                 len(self.errors))
+
+    def _run(self):
+        views = self.model_views()
+        self.total = len(views) * len(self.form_types)
+        log.info('Warming %d schemas', self.total)
+        for view in views:
+            for form_type in self.form_types:
+                self._warm(view, form_type)
+
+    def _warm(self, view, form_type):
+        try:
+            self.cache.get(view, form_type=form_type)
+        except Exception as e:
+            log.exception('Failed to warm the %s schema of %s', form_type,
+                          view.__name__)
+            self.errors.append((view, form_type, e))
+        self.done += 1
+        log.debug('Warmed %d/%d schemas', self.done, self.total)
+        if self.progress is not None:
+            self.progress(self.done, self.total, view, form_type)